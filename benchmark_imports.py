@@ -0,0 +1,176 @@
+"""
+Benchmark the time it takes to import QCoDeS at each version.
+
+At the commit of each version in utils.GIT_HASHES, qcodes and qcodes.dataset
+are imported in fresh interpreters with -X importtime, from a worktree of the
+commit. The first import of each is cold: the bytecode of the worktree is
+removed before it, so it includes compiling QCoDeS, as after an upgrade. The
+imports after it are warm. For each version and module, the wall time of the
+import statement (leaving out the start of the interpreter) and the
+breakdown of -X importtime of the cold import and of the median warm one are
+written as JSON.
+
+Unlike the generating scripts, this only works with worktrees: importing from
+the git objects would time git instead.
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List, Sequence, Union
+
+# NB: it's important that we do not import anything from qcodes in this
+# process, the imports are timed in interpreters of their own
+import utils as utils
+
+MODULES = ('qcodes', 'qcodes.dataset')
+
+# Times the import of the module and tells where qcodes came from
+_SNIPPET = ('import time\n'
+            'start = time.perf_counter()\n'
+            'import {module}\n'
+            'print(time.perf_counter() - start)\n'
+            'import qcodes\n'
+            'print(qcodes.__file__)\n')
+
+# A line of -X importtime: self and cumulative time in us, and the module,
+# indented by its depth in the imports
+_IMPORTTIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def parse_importtime(output: str) -> List[Dict[str, Any]]:
+    """
+    The modules imported according to the -X importtime output, in the order
+    their imports finished, with their own and cumulative time in seconds
+    and their depth in the imports (0 for the module imported by the script)
+    """
+    modules = []
+    for line in output.splitlines():
+        match = _IMPORTTIME.match(line)
+        if match is None:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        modules.append({'module': module,
+                        'self': int(self_us) / 1e6,
+                        'cumulative': int(cumulative_us) / 1e6,
+                        'depth': (len(indent) - 1) // 2})
+    return modules
+
+
+def clear_bytecode(directory: str) -> None:
+    """
+    Remove the __pycache__ folders below directory
+    """
+    for root, dirs, _ in os.walk(directory):
+        if '__pycache__' in dirs:
+            shutil.rmtree(os.path.join(root, '__pycache__'),
+                          ignore_errors=True)
+            dirs.remove('__pycache__')
+
+
+def time_import(module: str, worktree: str) -> Dict[str, Any]:
+    """
+    Import the module with qcodes from the worktree in a fresh interpreter
+    and return the wall time of the import and the -X importtime breakdown
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [worktree] + [path for path in [env.get('PYTHONPATH')] if path])
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         _SNIPPET.format(module=module)],
+        capture_output=True, text=True, env=env, cwd=worktree)
+    if process.returncode != 0:
+        raise RuntimeError(f'Importing {module} from {worktree} failed:\n'
+                           f'{process.stderr}')
+
+    # The last two lines, whatever the import printed before them and even if
+    # the path of qcodes has spaces in it
+    wall_time, qcodes_file = process.stdout.splitlines()[-2:]
+    qcpath = os.sep.join(qcodes_file.split(os.sep)[:-2])
+    # Windows and paths... There can be random un-capitalizations
+    if qcpath.lower() != worktree.lower():
+        raise ValueError(f'qcodes was imported from {qcpath}, not from '
+                         f'{worktree}, can not proceed')
+    return {'wall_time': float(wall_time),
+            'importtime': parse_importtime(process.stderr)}
+
+
+def measure_imports(worktree: str, modules: Sequence[str],
+                    repeat: int) -> Dict[str, Dict[str, Any]]:
+    """
+    Time a cold and repeat warm imports of each module from the worktree
+    """
+    results = {}
+    for module in modules:
+        clear_bytecode(worktree)
+        cold = time_import(module, worktree)
+        warm = sorted((time_import(module, worktree) for _ in range(repeat)),
+                      key=lambda timing: timing['wall_time'])
+        median = warm[len(warm) // 2]
+        results[module] = {
+            'cold': cold['wall_time'],
+            'warm': [timing['wall_time'] for timing in warm],
+            'warm_median': statistics.median(timing['wall_time']
+                                             for timing in warm),
+            'cold_importtime': cold['importtime'],
+            'warm_importtime': median['importtime']}
+    return results
+
+
+def run_benchmarks(versions: Sequence[Union[int, str]],
+                   modules: Sequence[str] = MODULES,
+                   repeat: int = 5) -> List[Dict[str, Any]]:
+    """
+    Time the imports of the modules at each version, one at a time
+    """
+    results = []
+    worktree_dir = tempfile.mkdtemp(prefix='qcodes_worktrees_')
+    try:
+        for version in versions:
+            worktree = utils.add_worktree(version, worktree_dir)
+            try:
+                timings = measure_imports(worktree, modules, repeat)
+            finally:
+                utils.remove_worktree(worktree)
+            print(f'{version!s:>3}  ' + '  '.join(
+                f"{module} cold {timing['cold']:.3f} s "
+                f"warm {timing['warm_median']:.3f} s"
+                for module, timing in timings.items()))
+            results.append({'version': version,
+                            'git_hash': utils.GIT_HASHES[version],
+                            'modules': timings})
+    finally:
+        shutil.rmtree(worktree_dir, ignore_errors=True)
+        utils.git_repo().git.worktree('prune')
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('versions', nargs='*', type=utils.parse_version,
+                        help='versions to benchmark (default: all)')
+    parser.add_argument('--modules', nargs='+', default=list(MODULES),
+                        help='modules to import (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of warm imports of each module '
+                             '(default: %(default)s)')
+    parser.add_argument('-o', '--output', default='import_benchmarks.json',
+                        help='file to write the results to')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.versions or list(utils.GIT_HASHES),
+                             args.modules, args.repeat)
+    with open(args.output, 'w') as f:
+        json.dump({'python': sys.version, 'results': results}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,285 @@
+"""
+Benchmark looking up runs in .db-files with many runs, before and after the
+upgrades that index the runs table.
+
+The 1->2 upgrade indexes the runs by exp_id and GUID, and the 8->9 upgrade by
+captured_run_id. The lookups of QCoDeS (load_by_id, load_by_guid,
+load_by_counter, load_by_run_spec and the runs of an experiment) are timed on
+a copy of each .db-file with many runs of version 1 and 8 (see
+fixture_spec.MANY_RUNS), which is then upgraded with the QCoDeS that is
+checked out, like in benchmark_upgrades.py, and the lookups are timed again
+on the upgraded file. The files of version 2, which got the indexes when they
+were made, are timed as they are. So for each lookup, the results tell how
+much the index saves per lookup, and how many lookups it takes to win back
+the time it took to build.
+
+The lookups are made with the SQL queries of QCoDeS rather than its API, so
+that the index is all that differs between before and after, and the query
+plans of SQLite are recorded along with the times. The .db-files with many
+runs are only generated with the --scale option, e.g.
+
+    python generate_all.py 1 2 8 --scale runs=1e5 --only '*/many_runs*' --raw
+    python benchmark_lookups.py
+
+The results are written as JSON.
+"""
+
+import argparse
+import glob
+import json
+import math
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+# NB: utils is only used for the paths here, qcodes is imported in the
+# processes that run the upgrades
+import utils as utils
+import benchmark_upgrades
+
+
+class Lookup(NamedTuple):
+    """
+    A lookup of QCoDeS: its name, the SQL query it makes and a query giving
+    the parameters it can be made with
+    """
+    name: str
+    sql: str
+    keys: str
+
+
+LOOKUPS = (
+    Lookup('load_by_id', 'SELECT * FROM runs WHERE run_id=?',
+           'SELECT run_id FROM runs'),
+    Lookup('load_by_guid', 'SELECT run_id FROM runs WHERE guid=?',
+           'SELECT guid FROM runs'),
+    Lookup('load_by_counter',
+           'SELECT run_id FROM runs WHERE result_counter=? AND exp_id=?',
+           'SELECT result_counter, exp_id FROM runs'),
+    Lookup('load_by_run_spec',
+           'SELECT run_id FROM runs WHERE captured_run_id=?',
+           'SELECT captured_run_id FROM runs'),
+    Lookup('experiment_runs', 'SELECT * FROM runs WHERE exp_id=?',
+           'SELECT exp_id FROM experiments'),
+    Lookup('last_run', 'SELECT run_id, MAX(run_timestamp) FROM runs '
+                       'WHERE exp_id=?',
+           'SELECT exp_id FROM experiments'))
+
+
+class IndexedFixtures(NamedTuple):
+    """
+    A fixture folder with many runs and the upgrade step indexing its files,
+    if they are not indexed already
+    """
+    fixtures: str
+    step: Optional[str]
+
+
+INDEXED_FIXTURES = (IndexedFixtures('version1', '1->2'),
+                    IndexedFixtures('version2', None),
+                    IndexedFixtures('version8', '8->9'))
+
+
+def sample_keys(conn: sqlite3.Connection, lookup: Lookup, count: int,
+                rng: random.Random) -> Optional[List[Tuple]]:
+    """
+    Up to count parameters of the lookup drawn from the .db-file, or None if
+    the file does not have the columns for it
+    """
+    try:
+        keys = conn.execute(lookup.keys).fetchall()
+    except sqlite3.OperationalError:
+        return None
+    return rng.sample(keys, min(count, len(keys)))
+
+
+def query_plan(conn: sqlite3.Connection, lookup: Lookup,
+               key: Tuple) -> List[str]:
+    """
+    How SQLite goes about the lookup, e.g. whether it uses an index
+    """
+    return [row[-1] for row in conn.execute(f'EXPLAIN QUERY PLAN {lookup.sql}',
+                                            key)]
+
+
+def time_lookup(conn: sqlite3.Connection, lookup: Lookup,
+                keys: Sequence[Tuple], repeat: int) -> float:
+    """
+    The mean time of the lookup over the keys, the fastest of repeat passes
+    """
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for key in keys:
+            conn.execute(lookup.sql, key).fetchall()
+        best = min(best, (time.perf_counter() - start) / len(keys))
+    return best
+
+
+def _time_lookups(path: str, keys: Dict[str, List[Tuple]],
+                  repeat: int) -> Dict[str, Dict[str, Any]]:
+    conn = sqlite3.connect(path)
+    try:
+        return {lookup.name: {'time': time_lookup(conn, lookup,
+                                                  keys[lookup.name], repeat),
+                              'plan': query_plan(conn, lookup,
+                                                 keys[lookup.name][0])}
+                for lookup in LOOKUPS if keys.get(lookup.name)}
+    finally:
+        conn.close()
+
+
+def measure_lookups(fixture: str,
+                    step: Optional[benchmark_upgrades.UpgradeStep],
+                    workdir: str, count: int, repeat: int,
+                    seed: int = 0) -> Dict[str, Any]:
+    """
+    Time the lookups on a copy of a fixture, and if a step is given, upgrade
+    the copy and time them again. Meant to be run in a fresh process.
+    """
+    path = os.path.join(workdir, os.path.basename(fixture))
+    shutil.copy2(fixture, path)
+    size_before = os.path.getsize(path)
+
+    conn = sqlite3.connect(path)
+    try:
+        rng = random.Random(seed)
+        keys = {lookup.name: sample_keys(conn, lookup, count, rng)
+                for lookup in LOOKUPS}
+        runs = conn.execute('SELECT COUNT(*) FROM runs').fetchone()[0]
+        experiments = conn.execute(
+            'SELECT COUNT(*) FROM experiments').fetchone()[0]
+    finally:
+        conn.close()
+
+    result: Dict[str, Any] = {'runs': runs, 'experiments': experiments,
+                              'size_before': size_before}
+    before = _time_lookups(path, keys, repeat)
+
+    if step is None:
+        result['lookups'] = before
+        os.remove(path)
+        return result
+
+    upgrade = benchmark_upgrades.upgrade_function(step.function)
+    conn = benchmark_upgrades.connect_without_upgrade(path)
+    user_version = conn.execute('PRAGMA user_version').fetchone()[0]
+    if user_version != step.from_version:
+        raise ValueError(f'{fixture} has user_version {user_version}, can not '
+                         f'upgrade it with {step.name}')
+    start = time.perf_counter()
+    upgrade(conn)
+    build_time = time.perf_counter() - start
+    conn.close()
+
+    after = _time_lookups(path, keys, repeat)
+    result.update(step=step.name, build_time=build_time,
+                  size_after=os.path.getsize(path))
+    result['lookups'] = {}
+    for name, timing in before.items():
+        saved = timing['time'] - after[name]['time']
+        # the number of lookups that win back the time of the upgrade, if it
+        # changed how SQLite goes about them at all
+        indexed = timing['plan'] != after[name]['plan']
+        result['lookups'][name] = {
+            'before': timing['time'],
+            'after': after[name]['time'],
+            'plan_before': timing['plan'],
+            'plan_after': after[name]['plan'],
+            'break_even': (math.ceil(build_time / saved)
+                           if indexed and saved > 0 else None)}
+    os.remove(path)
+    return result
+
+
+def fixtures_of(indexed: IndexedFixtures, pattern: str) -> List[str]:
+    """
+    The .db-files, relative to utils.fixturepath, to benchmark the lookups on
+    """
+    paths = glob.glob(os.path.join(utils.fixturepath, indexed.fixtures,
+                                   pattern))
+    return sorted(os.path.relpath(path, utils.fixturepath).replace(os.sep, '/')
+                  for path in paths)
+
+
+def _microseconds(value: float) -> str:
+    return f'{value * 1e6:9.1f} us'
+
+
+def _print_result(fixture: str, result: Dict[str, Any]) -> None:
+    heading = f"{fixture}: {result['runs']} runs"
+    if 'step' in result:
+        heading += f", {result['step']} took {result['build_time']:.3f} s"
+    print(heading)
+    for name, timing in result['lookups'].items():
+        if 'step' not in result:
+            print(f"  {name:<18} {_microseconds(timing['time'])}")
+            continue
+        line = (f"  {name:<18} {_microseconds(timing['before'])} -> "
+                f"{_microseconds(timing['after'])}")
+        if timing['break_even'] is not None:
+            line += f"  pays off after {timing['break_even']} lookups"
+        print(line)
+
+
+def run_benchmarks(pattern: str = 'many_runs*.db', count: int = 1000,
+                   repeat: int = 3) -> List[Dict[str, Any]]:
+    """
+    Benchmark the lookups on each .db-file with many runs, one at a time
+    """
+    steps = {step.name: step for step in benchmark_upgrades.UPGRADE_STEPS}
+    context = multiprocessing.get_context('spawn')
+    results = []
+    workdir = tempfile.mkdtemp(prefix='qcodes_lookup_benchmark_')
+    try:
+        with context.Pool(processes=1, maxtasksperchild=1) as pool:
+            for indexed in INDEXED_FIXTURES:
+                step = None if indexed.step is None else steps[indexed.step]
+                for fixture in fixtures_of(indexed, pattern):
+                    fullpath = os.path.join(utils.fixturepath,
+                                            *fixture.split('/'))
+                    result = pool.apply(measure_lookups,
+                                        (fullpath, step, workdir, count,
+                                         repeat))
+                    _print_result(fixture, result)
+                    results.append({'fixture': fixture, **result})
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--fixtures', default='many_runs*.db',
+                        help='glob pattern selecting the .db-files of each '
+                             'version (default: %(default)s)')
+    parser.add_argument('--lookups', type=int, default=1000,
+                        help='number of runs or experiments to look up '
+                             '(default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of times to time the lookups, of which '
+                             'the fastest is kept (default: %(default)s)')
+    parser.add_argument('-o', '--output', default='lookup_benchmarks.json',
+                        help='file to write the results to')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.fixtures, args.lookups, args.repeat)
+    if not results:
+        print('No .db-files with many runs found, generate them with e.g. '
+              "--scale runs=1e4 --only '*/many_runs*'")
+        return 1
+
+    with open(args.output, 'w') as f:
+        json.dump({'qcodes_commit': utils.git_repo().head.commit.hexsha,
+                   'results': results}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
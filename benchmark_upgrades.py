@@ -0,0 +1,232 @@
+"""
+Benchmark the database upgrade functions of QCoDeS on the generated fixtures.
+
+Every upgrade step (see the overview in utils.py) is run on a copy of each
+.db-file of the version it upgrades from, including the files generated with
+the --scale option, and the wall time, the number of runs upgraded per second,
+the peak memory use and the size of the file before and after are recorded.
+Each measurement is made in a fresh process, so that the peak memory use is
+that of a single upgrade.
+
+Unlike the generating scripts, this uses the QCoDeS that is checked out, since
+the upgrade functions of interest are those of the current QCoDeS.
+
+The results are written as JSON. Given a baseline from an earlier run with
+--compare, the exit code is non-zero if any step got slower than the baseline
+by more than --threshold.
+"""
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, NamedTuple, Sequence
+
+# NB: utils is only used for the paths here, qcodes is imported in the
+# processes that run the upgrades
+import utils as utils
+from instrumentation import peak_rss
+
+
+class UpgradeStep(NamedTuple):
+    """
+    An upgrade step: its name, the name of the function doing it, the fixture
+    folder with the .db-files to upgrade and the user_version of those files
+    """
+    name: str
+    function: str
+    fixtures: str
+    from_version: int
+
+
+UPGRADE_STEPS = (
+    UpgradeStep('0->1', 'perform_db_upgrade_0_to_1', 'version0', 0),
+    UpgradeStep('1->2', 'perform_db_upgrade_1_to_2', 'version1', 1),
+    UpgradeStep('2->3', 'perform_db_upgrade_2_to_3', 'version2', 2),
+    UpgradeStep('3->4', 'perform_db_upgrade_3_to_4', 'version3', 3),
+    UpgradeStep('4a fix', 'fix_version_4a_run_description_bug', 'version4a',
+                4),
+    UpgradeStep('4->5', 'perform_db_upgrade_4_to_5', 'version4', 4),
+    UpgradeStep('5->6', 'perform_db_upgrade_5_to_6', 'version5', 5),
+    UpgradeStep('6->7', 'perform_db_upgrade_6_to_7', 'version6', 6),
+    UpgradeStep('7->8', 'perform_db_upgrade_7_to_8', 'version7', 7),
+    UpgradeStep('8->9', 'perform_db_upgrade_8_to_9', 'version8', 8))
+
+
+def upgrade_function(name: str):
+    """
+    Find an upgrade function in the QCoDeS at hand, wherever it lives
+    """
+    for module in ('qcodes.dataset.sqlite.db_upgrades',
+                   'qcodes.dataset.sqlite_base'):
+        try:
+            imported = __import__(module, fromlist=[name])
+        except ImportError:
+            continue
+        if hasattr(imported, name):
+            return getattr(imported, name)
+    raise ValueError(f'Upgrade function {name} not found in QCoDeS')
+
+
+def connect_without_upgrade(path: str):
+    """
+    Open a connection to a .db-file without upgrading it
+    """
+    conn = sqlite3.connect(path)
+    try:
+        from qcodes.dataset.sqlite.connection import ConnectionPlus
+    except ImportError:
+        return conn
+    return ConnectionPlus(conn)
+
+
+def measure_upgrade(step: UpgradeStep, fixture: str,
+                    workdir: str) -> Dict[str, Any]:
+    """
+    Run an upgrade step on a copy of a fixture and measure it. Meant to be
+    run in a fresh process.
+    """
+    upgrade = upgrade_function(step.function)
+
+    path = os.path.join(workdir, os.path.basename(fixture))
+    shutil.copy2(fixture, path)
+    size_before = os.path.getsize(path)
+
+    conn = connect_without_upgrade(path)
+    user_version = conn.execute('PRAGMA user_version').fetchone()[0]
+    if user_version != step.from_version:
+        raise ValueError(f'{fixture} has user_version {user_version}, can not '
+                         f'benchmark the {step.name} upgrade on it')
+    runs = conn.execute('SELECT COUNT(*) FROM runs').fetchone()[0]
+
+    rss_before = peak_rss()
+    start = time.perf_counter()
+    upgrade(conn)
+    wall_time = time.perf_counter() - start
+    conn.close()
+
+    size_after = os.path.getsize(path)
+    os.remove(path)
+
+    return {'wall_time': wall_time,
+            'runs': runs,
+            'runs_per_second': runs / wall_time if runs else None,
+            'peak_rss_before': rss_before,
+            'peak_rss': peak_rss(),
+            'size_before': size_before,
+            'size_after': size_after}
+
+
+def fixtures_of(step: UpgradeStep, pattern: str) -> List[str]:
+    """
+    The .db-files, relative to utils.fixturepath, to benchmark a step on
+    """
+    paths = glob.glob(os.path.join(utils.fixturepath, step.fixtures, pattern))
+    return sorted(os.path.relpath(path, utils.fixturepath).replace(os.sep, '/')
+                  for path in paths)
+
+
+def run_benchmarks(steps: Sequence[UpgradeStep], pattern: str = '*.db',
+                   repeat: int = 1) -> List[Dict[str, Any]]:
+    """
+    Benchmark each step on each of its fixtures, one at a time. Of repeated
+    measurements, the fastest is kept.
+    """
+    context = multiprocessing.get_context('spawn')
+    results = []
+    workdir = tempfile.mkdtemp(prefix='qcodes_upgrade_benchmark_')
+    try:
+        with context.Pool(processes=1, maxtasksperchild=1) as pool:
+            for step in steps:
+                for fixture in fixtures_of(step, pattern):
+                    fullpath = os.path.join(utils.fixturepath,
+                                            *fixture.split('/'))
+                    measurements = [
+                        pool.apply(measure_upgrade, (step, fullpath, workdir))
+                        for _ in range(repeat)]
+                    best = min(measurements, key=lambda m: m['wall_time'])
+                    result = {'step': step.name, 'fixture': fixture, **best}
+                    throughput = ('' if best['runs_per_second'] is None
+                                  else f"{best['runs_per_second']:10.0f} "
+                                       'runs/s')
+                    print(f"{step.name:>6} {fixture:<60} "
+                          f"{best['wall_time']:10.4f} s {throughput}")
+                    results.append(result)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def compare(results: Sequence[Dict[str, Any]],
+            baseline: Sequence[Dict[str, Any]],
+            threshold: float) -> List[str]:
+    """
+    Compare results with a baseline and return a message for each step and
+    fixture that got slower by more than the threshold (a fraction)
+    """
+    baseline_times = {(b['step'], b['fixture']): b['wall_time']
+                      for b in baseline}
+    regressions = []
+    for result in results:
+        before = baseline_times.get((result['step'], result['fixture']))
+        if before is None:
+            continue
+        if result['wall_time'] > before * (1 + threshold):
+            regressions.append(
+                f"{result['step']} on {result['fixture']}: "
+                f"{result['wall_time']:.4f} s against {before:.4f} s")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('steps', nargs='*',
+                        help='upgrade steps to benchmark, any of '
+                             f'{[step.name for step in UPGRADE_STEPS]} '
+                             '(default: all)')
+    parser.add_argument('--fixtures', default='*.db',
+                        help='glob pattern selecting the .db-files of each '
+                             'version (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='number of times to measure each upgrade')
+    parser.add_argument('-o', '--output', default='upgrade_benchmarks.json',
+                        help='file to write the results to')
+    parser.add_argument('--compare',
+                        help='results of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='fraction by which a step may get slower than '
+                             'in the baseline (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    names = [step.name for step in UPGRADE_STEPS]
+    for name in args.steps:
+        if name not in names:
+            parser.error(f'Unknown upgrade step {name!r}')
+
+    steps = [step for step in UPGRADE_STEPS
+             if not args.steps or step.name in args.steps]
+    results = run_benchmarks(steps, args.fixtures, args.repeat)
+
+    with open(args.output, 'w') as f:
+        json.dump({'qcodes_commit': utils.repo.head.commit.hexsha,
+                   'results': results}, f, indent=2)
+
+    if args.compare is None:
+        return 0
+
+    with open(args.compare) as f:
+        baseline = json.load(f)['results']
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f'Regression: {regression}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,293 @@
+"""
+Benchmark the write path of the datasets of QCoDeS at each version.
+
+At the commit of each version in utils.GIT_HASHES, a standard measurement is
+made the way the generators make their runs: parameters registered with a
+Measurement, x and y swept on a grid and the measured parameters added point
+by point with datasaver.add_result. For each version, the rows written per
+second, the percentiles of the time that the commits to the database took and
+the bytes of .db-file per row are recorded.
+
+Each version is measured in a fresh process importing QCoDeS from a worktree
+of its commit, or with --from-git-objects from the git objects. The QCoDeS
+repository itself is not checked out. Versions without Measurement are
+skipped. The results are written as JSON.
+"""
+
+import argparse
+import importlib
+import inspect
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import ExitStack, contextmanager
+from typing import (Any, Dict, Iterator, List, NamedTuple, Optional, Sequence,
+                    Union)
+
+# NB: it's important that we do not import anything from qcodes in this
+# process, each version is imported in a process of its own
+import utils as utils
+import bulk_data
+import db_tools
+import scheduler
+from instrumentation import peak_rss
+
+
+class Workload(NamedTuple):
+    """
+    The measurement to make: the number of runs, the number of points per
+    run on a grid of x and y, and the number of parameters measured at each
+    point. A write_period of None keeps the default of Measurement.
+    """
+    runs: int = 5
+    points: int = 10000
+    measured: int = 3
+    write_period: Optional[float] = None
+
+
+# The standard measurement
+DEFAULT_WORKLOAD = Workload()
+
+
+def percentile(values: Sequence[float], fraction: float) -> Optional[float]:
+    """
+    The value below which the given fraction of the values lie (nearest
+    rank), if there are any values
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1,
+                      int(round(fraction * len(ordered))) - 1))
+    return ordered[rank]
+
+
+@contextmanager
+def timed_commits(latencies: List[float]) -> Iterator[None]:
+    """
+    Context manager within which the commits of every new connection are
+    timed and their durations appended to latencies
+    """
+    class TimedConnection(sqlite3.Connection):
+        def commit(self):
+            start = time.perf_counter()
+            try:
+                return super().commit()
+            finally:
+                latencies.append(time.perf_counter() - start)
+
+    def connect(original, database, *args, **kwargs):
+        kwargs.setdefault('factory', TimedConnection)
+        return original(database, *args, **kwargs)
+
+    with db_tools.patched_connect(connect):
+        yield
+
+
+def _new_experiment(path: str):
+    """
+    Make an experiment in a new .db-file at path, like the generators of
+    the version would
+    """
+    from qcodes.dataset.experiment_container import Experiment
+
+    if 'name' in inspect.signature(Experiment).parameters:
+        return Experiment(path_to_db=path, name='benchmark',
+                          sample_name='no_sample')
+    exp = Experiment(path)
+    exp._new(name='benchmark', sample_name='no_sample')
+    return exp
+
+
+def measure_writes(workload: Workload,
+                   workdir: str) -> Optional[Dict[str, Any]]:
+    """
+    Make the measurement of the workload in a new .db-file in workdir with
+    the QCoDeS that is imported, and measure it. Returns None if the QCoDeS
+    has no Measurement.
+    """
+    try:
+        from qcodes.dataset.measurements import Measurement
+    except ImportError:
+        return None
+    from qcodes import Parameter
+
+    path = os.path.join(workdir, 'benchmark.db')
+    if os.path.exists(path):
+        os.remove(path)
+
+    latencies: List[float] = []
+    with timed_commits(latencies):
+        exp = _new_experiment(path)
+        x = Parameter('x', set_cmd=None, get_cmd=None)
+        y = Parameter('y', set_cmd=None, get_cmd=None)
+        measured = [Parameter(f'z{n}', set_cmd=None, get_cmd=None)
+                    for n in range(workload.measured)]
+        meas = Measurement(exp)
+        if workload.write_period is not None:
+            meas.write_period = workload.write_period
+        meas.register_parameter(x)
+        meas.register_parameter(y)
+        for param in measured:
+            meas.register_parameter(param, setpoints=(x, y))
+        size_before = os.path.getsize(path)
+        latencies.clear()
+
+        nx, ny = bulk_data.grid_shape(workload.points)
+        wall_time = 0.0
+        for _ in range(workload.runs):
+            # the values are drawn up front, so that only the writes count
+            columns = [values.tolist() for values in next(
+                bulk_data.iter_grid_values(nx, ny, workload.measured,
+                                           chunk_size=nx*ny))]
+            start = time.perf_counter()
+            with meas.run() as datasaver:
+                for xv, yv, *zs in zip(*columns):
+                    datasaver.add_result((x, xv), (y, yv),
+                                         *zip(measured, zs))
+            wall_time += time.perf_counter() - start
+
+    rows = workload.runs * nx * ny
+    size = os.path.getsize(path)
+    return {'rows': rows,
+            'wall_time': wall_time,
+            'rows_per_second': rows / wall_time,
+            'commits': len(latencies),
+            'commit_p50': percentile(latencies, 0.5),
+            'commit_p90': percentile(latencies, 0.9),
+            'commit_p99': percentile(latencies, 0.99),
+            'commit_max': max(latencies, default=None),
+            'bytes_per_row': (size - size_before) / rows,
+            'size': size,
+            'peak_rss': peak_rss()}
+
+
+def standard_measurement() -> float:
+    """
+    The time to write the standard measurement with the QCoDeS that is
+    imported, as a benchmark for perf_bisect.py
+    """
+    workdir = tempfile.mkdtemp(prefix='qcodes_write_benchmark_')
+    try:
+        result = measure_writes(DEFAULT_WORKLOAD, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if result is None:
+        raise ValueError('This QCoDeS has no Measurement')
+    return result['wall_time']
+
+
+def measure_version(version: Union[int, str], worktree: Optional[str],
+                    workload: Workload) -> Optional[Dict[str, Any]]:
+    """
+    Import QCoDeS at the version from the worktree, or from the git objects
+    if there is none, and measure the workload. Meant to be run in a fresh
+    process.
+    """
+    workdir = tempfile.mkdtemp(prefix='qcodes_write_benchmark_')
+    try:
+        with ExitStack() as stack:
+            if worktree is None:
+                import git_import
+                stack.enter_context(git_import.imported_from_commit(
+                    utils.git_repo(), utils.GIT_HASHES[version]))
+            else:
+                sys.path.insert(0, worktree)
+                importlib.invalidate_caches()
+                utils.check_qcodes_location(worktree)
+            return measure_writes(workload, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _milliseconds(value: Optional[float]) -> str:
+    return '' if value is None else f'{value * 1000:.2f}'
+
+
+def run_benchmarks(versions: Sequence[Union[int, str]], workload: Workload,
+                   repeat: int = 1) -> List[Dict[str, Any]]:
+    """
+    Measure the workload at each version, one at a time. Of repeated
+    measurements, the fastest is kept.
+    """
+    context = scheduler.pool_context()
+    results = []
+    worktree_dir = tempfile.mkdtemp(prefix='qcodes_worktrees_')
+    try:
+        for version in versions:
+            worktree = None
+            if not utils.from_git_objects():
+                worktree = utils.add_worktree(version, worktree_dir)
+            try:
+                measurements = []
+                for _ in range(repeat):
+                    with context.Pool(processes=1,
+                                      maxtasksperchild=1) as pool:
+                        measurements.append(pool.apply(
+                            measure_version, (version, worktree, workload)))
+            finally:
+                if worktree is not None:
+                    utils.remove_worktree(worktree)
+
+            if measurements[0] is None:
+                print(f'{version!s:>3} has no Measurement, skipped')
+                continue
+            best = max(measurements, key=lambda m: m['rows_per_second'])
+            print(f"{version!s:>3} {best['rows_per_second']:12.0f} rows/s  "
+                  f"commit p50 {_milliseconds(best['commit_p50']):>8} ms  "
+                  f"p99 {_milliseconds(best['commit_p99']):>8} ms  "
+                  f"{best['bytes_per_row']:8.1f} bytes/row")
+            results.append({'version': version,
+                            'git_hash': utils.GIT_HASHES[version],
+                            **best})
+    finally:
+        shutil.rmtree(worktree_dir, ignore_errors=True)
+        if not utils.from_git_objects():
+            utils.git_repo().git.worktree('prune')
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('versions', nargs='*', type=utils.parse_version,
+                        help='versions to benchmark (default: all)')
+    parser.add_argument('--runs', type=int, default=DEFAULT_WORKLOAD.runs,
+                        help='number of runs (default: %(default)s)')
+    parser.add_argument('--points', type=int, default=DEFAULT_WORKLOAD.points,
+                        help='number of points per run (default: '
+                             '%(default)s)')
+    parser.add_argument('--measured', type=int,
+                        default=DEFAULT_WORKLOAD.measured,
+                        help='number of parameters measured at each point '
+                             '(default: %(default)s)')
+    parser.add_argument('--write-period', type=float,
+                        help='write period of the Measurement in s (default: '
+                             'that of QCoDeS)')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='number of times to measure each version')
+    parser.add_argument('--from-git-objects', action='store_true',
+                        help='import QCoDeS straight from the git objects '
+                             'instead of adding worktrees')
+    parser.add_argument('-o', '--output', default='write_benchmarks.json',
+                        help='file to write the results to')
+    args = parser.parse_args(argv)
+
+    if args.from_git_objects:
+        os.environ[utils.FROM_GIT_OBJECTS_ENV] = '1'
+    workload = Workload(args.runs, args.points, args.measured,
+                        args.write_period)
+    results = run_benchmarks(args.versions or list(utils.GIT_HASHES),
+                             workload, args.repeat)
+
+    with open(args.output, 'w') as f:
+        json.dump({'workload': workload._asdict(), 'results': results}, f,
+                  indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
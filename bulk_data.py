@@ -0,0 +1,139 @@
+"""
+Batched feeding of data into the runs of the generated databases.
+
+Instead of drawing one random number and calling datasaver.add_result per
+point, the data of a run is made as NumPy arrays up front and written to the
+result table of the run in chunks. The rows end up exactly as the per-point
+loops of the generators would have written them. Runs that are too large to
+hold in memory are made and written a chunk at a time.
+
+NumPy is only imported once data is made, so that the generating functions can
+be listed and planned without it.
+"""
+
+import math
+from typing import TYPE_CHECKING, Any, Iterator, List, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Number of rows written to the database in one go
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def grid_shape(points: int) -> Tuple[int, int]:
+    """
+    The shape (nx, ny) of the squarest grid of exactly the given number of
+    points, e.g. (10, 10) for 100 points and (250, 400) for 1e5, so that a run
+    has as many rows as the name of a scaled .db-file says. A prime number of
+    points gives a single row of the grid.
+    """
+    points = max(1, points)
+    nx = int(math.sqrt(points))
+    while points % nx:
+        nx -= 1
+    return nx, points // nx
+
+
+def iter_grid_values(nx: int, ny: int, nz: int = 1,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE
+                     ) -> Iterator[Tuple['np.ndarray', ...]]:
+    """
+    Draw the values that the nested loop
+
+        for x in np.random.rand(nx):
+            for y in np.random.rand(ny):
+                z = np.random.rand()
+
+    draws, in the same order from numpy.random, and yield them as flat arrays
+    (x, y, z) in the order of the loop, in chunks of about chunk_size rows.
+    For nz > 1, nz values of z are drawn for each y and yielded as (x, y, z1,
+    z2, ...), so that only nz = 1 reproduces the loop. Only a chunk is held in
+    memory at a time.
+    """
+    import numpy as np
+
+    xs = np.random.rand(nx)
+    xs_per_chunk = max(1, chunk_size // ny)
+    for start in range(0, nx, xs_per_chunk):
+        block = xs[start:start + xs_per_chunk]
+        # for each x, ny values of y are drawn and then ny values of each z
+        rest = np.random.rand(len(block), (1 + nz)*ny)
+        x = np.repeat(block, ny)
+        y = rest[:, :ny].ravel()
+        zs = tuple(rest[:, (1 + n)*ny:(2 + n)*ny].ravel() for n in range(nz))
+        yield (x, y) + zs
+
+
+def grid_values(nx: int,
+                ny: int) -> Tuple['np.ndarray', 'np.ndarray', 'np.ndarray']:
+    """
+    All the values of iter_grid_values in one go as three flat arrays of
+    length nx*ny
+    """
+    x, y, z = next(iter_grid_values(nx, ny, chunk_size=nx*ny))
+    return x, y, z
+
+
+def add_grid_results(datasaver, x_param, y_param, z_params: Sequence,
+                     points: int, constants: Sequence[Tuple[Any, Any]] = (),
+                     chunk_size: int = DEFAULT_CHUNK_SIZE) -> None:
+    """
+    Add the values of iter_grid_values on the grid_shape of points to the run
+    of a datasaver, chunk by chunk. The constants are (parameter, value)
+    pairs added to every row.
+    """
+    nx, ny = grid_shape(points)
+    for x, y, *zs in iter_grid_values(nx, ny, len(z_params), chunk_size):
+        add_results(datasaver, *constants, (x_param, x), (y_param, y),
+                    *zip(z_params, zs), chunk_size=chunk_size)
+
+
+def add_results(datasaver, *results: Tuple[Any, Any],
+                chunk_size: int = DEFAULT_CHUNK_SIZE) -> None:
+    """
+    Add many rows to the run of a datasaver at once. The results are
+    (parameter, values) pairs like those of datasaver.add_result, but the
+    values are arrays holding a value per row. Scalars are used for all rows.
+
+    Where the DataSet of the QCoDeS version at hand has add_results, the rows
+    go through that, otherwise they are inserted into the result table of the
+    run with executemany.
+    """
+    # Get rows already added with add_result into the table first, so that
+    # the order of the rows is kept
+    datasaver.flush_data_to_database()
+    dataset = datasaver._dataset
+
+    names = [str(parameter) for parameter, _ in results]
+    for rows in iter_rows(*(values for _, values in results),
+                          chunk_size=chunk_size):
+        if hasattr(dataset, 'add_results'):
+            dataset.add_results([dict(zip(names, row)) for row in rows])
+        else:
+            quoted = ','.join(f'"{name}"' for name in names)
+            placeholders = ','.join('?' * len(names))
+            dataset.conn.executemany(
+                f'INSERT INTO "{dataset.table_name}" ({quoted}) '
+                f'VALUES ({placeholders})', rows)
+            dataset.conn.commit()
+
+
+def iter_rows(*columns: Any,
+              chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[tuple]]:
+    """
+    Turn columns, given as arrays holding a value per row or as scalars used
+    for all rows, into lists of row tuples of at most chunk_size rows
+    """
+    import numpy as np
+
+    arrays = [np.asarray(values) for values in columns]
+    length = max(array.size for array in arrays)
+    broadcast = [np.broadcast_to(array, (length,)) for array in arrays]
+
+    for start in range(0, length, chunk_size):
+        # tolist turns the values into Python ints and floats, like the
+        # values given to add_result by the generators
+        chunk = [column[start:start + chunk_size].tolist()
+                 for column in broadcast]
+        yield list(zip(*chunk))
@@ -0,0 +1,221 @@
+"""
+Tools for the SQLite side of generating database files.
+
+The generators connect to their .db-files through the historical QCoDeS API,
+which in turn calls sqlite3.connect. Patching sqlite3.connect while a
+generator runs is therefore the way to change how every connection it makes
+behaves, without touching the (historical) QCoDeS code.
+"""
+
+import gc
+import itertools
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Sequence
+
+# Pragmas for writing fast at the expense of durability: the journal is kept
+# in memory (not turned off, since QCoDeS relies on rolling back), nothing is
+# synced to disk and up to 1 GiB of pages is cached
+FAST_PRAGMAS = ('PRAGMA journal_mode=MEMORY',
+                'PRAGMA synchronous=OFF',
+                'PRAGMA cache_size=-1048576')
+
+# The time at which the clock starts in deterministic mode (2020-01-01 UTC)
+FROZEN_EPOCH = 1577836800.0
+
+# The page size of canonical .db-files
+CANONICAL_PAGE_SIZE = 4096
+
+# Offsets in the header of a database file of the file change counter, of the
+# schema cookie and of the counter that the stored SQLite version number is
+# valid for. The schema cookie only has to change while connections are open.
+_HEADER_COUNTERS = (24, 40, 92)
+
+
+@contextmanager
+def patched_connect(wrapper: Callable[..., sqlite3.Connection]
+                    ) -> Iterator[None]:
+    """
+    Context manager within which sqlite3.connect(database, ...) calls
+    wrapper(original_connect, database, ...) instead
+    """
+    original = sqlite3.connect
+
+    def connect(database, *args, **kwargs):
+        return wrapper(original, database, *args, **kwargs)
+
+    sqlite3.connect = connect
+    try:
+        yield
+    finally:
+        sqlite3.connect = original
+
+
+@contextmanager
+def fast_writes() -> Iterator[None]:
+    """
+    Context manager within which every new connection uses FAST_PRAGMAS
+    """
+    def connect(original, database, *args, **kwargs):
+        conn = original(database, *args, **kwargs)
+        for pragma in FAST_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    with patched_connect(connect):
+        yield
+
+
+def _normalized(path) -> str:
+    return os.path.normcase(os.path.abspath(os.fspath(path)))
+
+
+def copy_database(source: str, target: str) -> None:
+    """
+    Copy the database at source to target in one pass with the backup API of
+    SQLite. Unlike copying the file, this goes through sqlite3.connect, so it
+    also works for databases that are being built elsewhere. A file at target
+    is removed first, so that the header of the copy does not depend on it.
+    """
+    if os.path.exists(target):
+        os.remove(target)
+    source_conn = sqlite3.connect(source)
+    target_conn = sqlite3.connect(target)
+    try:
+        source_conn.backup(target_conn)
+    finally:
+        target_conn.close()
+        source_conn.close()
+
+
+@contextmanager
+def built_elsewhere(targets: Sequence[str], build_dir: str) -> Iterator[None]:
+    """
+    Context manager within which connections to any of the target paths are
+    redirected to a database in build_dir, a folder (e.g. on a tmpfs) or
+    ':memory:' for in-memory databases shared by all connections of this
+    process. When the context is left without an error, each built database
+    is copied to its target with the backup API and moved in place in one
+    go, so that a target is never half-written. After an error, the built
+    databases are thrown away.
+    """
+    in_memory = build_dir == ':memory:'
+    builds: Dict[str, str] = {}
+    for n, target in enumerate(targets):
+        if in_memory:
+            builds[_normalized(target)] = (f'file:qcodes_build_{os.getpid()}_'
+                                           f'{n}?mode=memory&cache=shared')
+        else:
+            build = os.path.join(
+                build_dir, f'{os.getpid()}_{n}_{os.path.basename(target)}')
+            if os.path.exists(build):
+                os.remove(build)
+            builds[_normalized(target)] = build
+
+    def connect(original, database, *args, **kwargs):
+        build = builds.get(_normalized(database)) \
+            if isinstance(database, (str, os.PathLike)) else None
+        if build is None:
+            return original(database, *args, **kwargs)
+        if in_memory:
+            kwargs['uri'] = True
+        return original(build, *args, **kwargs)
+
+    # An in-memory database only lives as long as a connection to it is open
+    anchors = [sqlite3.connect(build, uri=True)
+               for build in builds.values()] if in_memory else []
+
+    try:
+        with patched_connect(connect):
+            yield
+
+        # Connections that the generator left behind are closed when collected
+        gc.collect()
+
+        for target, build in zip(targets, builds.values()):
+            partial = f'{target}.partial'
+            if os.path.exists(partial):
+                os.remove(partial)
+            build_conn = sqlite3.connect(build, uri=in_memory)
+            partial_conn = sqlite3.connect(partial)
+            try:
+                build_conn.backup(partial_conn)
+            finally:
+                partial_conn.close()
+                build_conn.close()
+            os.replace(partial, target)
+    finally:
+        for anchor in anchors:
+            anchor.close()
+        if not in_memory:
+            for build in builds.values():
+                if os.path.exists(build):
+                    os.remove(build)
+
+
+def finalize(path: str, user_version: int) -> None:
+    """
+    Compact and analyze a freshly generated .db-file, and make sure that it
+    has the expected user_version
+    """
+    # Connections that the generator left behind are closed when collected
+    gc.collect()
+
+    conn = sqlite3.connect(path)
+    try:
+        found = conn.execute('PRAGMA user_version').fetchone()[0]
+        if found != user_version:
+            raise ValueError(f'{path} has user_version {found}, expected '
+                             f'{user_version}')
+        conn.execute('VACUUM')
+        conn.execute('ANALYZE')
+        conn.commit()
+    finally:
+        conn.close()
+
+
+@contextmanager
+def frozen_clock(start: float = FROZEN_EPOCH,
+                 step: float = 0.001) -> Iterator[None]:
+    """
+    Context manager within which time.time returns start, start + step,
+    start + 2*step, ... on consecutive calls, so that the timestamps and the
+    GUIDs made from them are the same every time and still increase
+    """
+    original = time.time
+    ticks = itertools.count()
+
+    def frozen_time() -> float:
+        return start + next(ticks)*step
+
+    time.time = frozen_time
+    try:
+        yield
+    finally:
+        time.time = original
+
+
+def canonicalize(path: str) -> None:
+    """
+    Rewrite a .db-file such that files with the same content are the same
+    byte for byte: a fixed page size, no free pages, pages in the order of
+    VACUUM and the change counters and schema cookie in the header set to 1
+    """
+    # Connections that the generator left behind are closed when collected
+    gc.collect()
+
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        # the page size can not change in WAL mode
+        conn.execute('PRAGMA journal_mode=DELETE')
+        conn.execute(f'PRAGMA page_size={CANONICAL_PAGE_SIZE}')
+        conn.execute('VACUUM')
+    finally:
+        conn.close()
+
+    with open(path, 'r+b') as f:
+        for offset in _HEADER_COUNTERS:
+            f.seek(offset)
+            f.write((1).to_bytes(4, 'big'))
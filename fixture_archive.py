@@ -0,0 +1,188 @@
+"""
+Pack the generated fixtures into one compressed archive, and get them out.
+
+The archive is a zip file with the .db-files compressed with LZMA, stored
+under their paths relative to the fixture folder (e.g. version3/some_runs.db),
+and an index.json listing the version, name, size and SHA-256 hash of each.
+Fixtures are extracted one at a time on demand, streaming from the archive,
+and checked against their hash on the way.
+
+    python fixture_archive.py pack fixtures.zip
+    python fixture_archive.py list fixtures.zip
+    python fixture_archive.py extract fixtures.zip [version3/some_runs.db ...]
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import zipfile
+from typing import Dict, List, NamedTuple, Optional, Sequence, Union
+
+import fixture_cache
+import utils as utils
+
+INDEX_NAME = 'index.json'
+
+# The size of the blocks that fixtures are streamed in
+_BLOCK_SIZE = 1 << 20
+
+
+class Entry(NamedTuple):
+    """
+    A fixture in an archive: its version, its file name and the size and
+    SHA-256 hash of the file
+    """
+    version: Union[int, str]
+    name: str
+    size: int
+    sha256: str
+
+    @property
+    def path(self) -> str:
+        """
+        The path of the fixture in the archive and in the fixture folder
+        """
+        return f'version{self.version}/{self.name}'
+
+
+def _version(folder: str) -> Union[int, str]:
+    version = folder[len('version'):]
+    return int(version) if version.isdigit() else version
+
+
+def pack(archive: str, fixturepath: str,
+         pattern: str = 'version*/*.db') -> List[Entry]:
+    """
+    Pack the fixtures matching the pattern in the fixture folder into a new
+    archive and return its index
+    """
+    entries = []
+    partial = f'{archive}.partial'
+    with zipfile.ZipFile(partial, 'w', compression=zipfile.ZIP_LZMA) as zf:
+        for path in sorted(glob.glob(os.path.join(fixturepath, pattern))):
+            folder, name = os.path.split(os.path.relpath(path, fixturepath))
+            entry = Entry(_version(folder), name, os.path.getsize(path),
+                          fixture_cache.file_hash(path))
+            zf.write(path, entry.path)
+            entries.append(entry)
+        zf.writestr(INDEX_NAME, json.dumps(
+            [entry._asdict() for entry in entries], indent=2),
+            compress_type=zipfile.ZIP_DEFLATED)
+    os.replace(partial, archive)
+    return entries
+
+
+class FixtureArchive:
+    """
+    Reader of an archive made by pack. Fixtures are extracted on demand,
+    into a temporary folder unless told otherwise, which is removed when the
+    reader is closed.
+    """
+
+    def __init__(self, archive: str):
+        self._zipfile = zipfile.ZipFile(archive)
+        self._tempdir: Optional[str] = None
+        index = json.loads(self._zipfile.read(INDEX_NAME))
+        self.entries: Dict[str, Entry] = {}
+        for item in index:
+            entry = Entry(**item)
+            self.entries[entry.path] = entry
+
+    def __enter__(self) -> 'FixtureArchive':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._zipfile.close()
+        if self._tempdir is not None:
+            shutil.rmtree(self._tempdir, ignore_errors=True)
+            self._tempdir = None
+
+    def extract(self, path: str, directory: Optional[str] = None) -> str:
+        """
+        Extract the fixture at path (e.g. 'version3/some_runs.db') into
+        directory, keeping its version folder, and return where it went. The
+        fixture is streamed from the archive and its hash checked; a fixture
+        that does not match is not left behind.
+        """
+        entry = self.entries.get(path)
+        if entry is None:
+            raise ValueError(f'{path} is not in the archive')
+        if directory is None:
+            if self._tempdir is None:
+                self._tempdir = tempfile.mkdtemp(prefix='qcodes_fixtures_')
+            directory = self._tempdir
+
+        target = os.path.join(directory, *path.split('/'))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        partial = f'{target}.partial'
+        sha = hashlib.sha256()
+        with self._zipfile.open(path) as source, open(partial, 'wb') as f:
+            for block in iter(lambda: source.read(_BLOCK_SIZE), b''):
+                sha.update(block)
+                f.write(block)
+        if sha.hexdigest() != entry.sha256:
+            os.remove(partial)
+            raise ValueError(f'{path} in the archive does not match its hash')
+        os.replace(partial, target)
+        return target
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Pack the generated fixtures into a compressed archive, '
+                    'list it or extract fixtures from it')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    pack_parser = subparsers.add_parser('pack', help='make an archive')
+    pack_parser.add_argument('archive')
+    pack_parser.add_argument('--fixtures', default='version*/*.db',
+                             help='glob pattern selecting the fixtures '
+                                  '(default: %(default)s)')
+
+    list_parser = subparsers.add_parser('list', help='list an archive')
+    list_parser.add_argument('archive')
+
+    extract_parser = subparsers.add_parser('extract',
+                                           help='extract fixtures')
+    extract_parser.add_argument('archive')
+    extract_parser.add_argument('paths', nargs='*',
+                                help='fixtures to extract, like '
+                                     'version3/some_runs.db (default: all)')
+    extract_parser.add_argument('--to',
+                                help='folder to extract to (default: the '
+                                     'fixture folder of QCoDeS)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'pack':
+        entries = pack(args.archive, utils.fixturepath, args.fixtures)
+        size = sum(entry.size for entry in entries)
+        print(f'Packed {len(entries)} fixtures of {size} bytes into '
+              f'{os.path.getsize(args.archive)} bytes')
+        return 0
+
+    with FixtureArchive(args.archive) as archive:
+        if args.command == 'list':
+            for entry in archive.entries.values():
+                print(f'{entry.path:<70} {entry.size:>12} '
+                      f'{entry.sha256[:12]}')
+            return 0
+
+        directory = args.to
+        if directory is None:
+            directory = utils.fixturepath
+        for path in args.paths or list(archive.entries):
+            print(archive.extract(path, directory))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+A content-addressed cache of generated database files.
+
+A fixture is cached under a key made from the git hash of the QCoDeS commit it
+was generated with, the source code of the generating function and the seed
+of NumPy's random number generator. As long as none of those change, the
+stored files can simply be restored instead of checking out QCoDeS and running
+the generator again.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import tempfile
+from typing import Callable, List, Sequence
+
+CACHE_DIR_ENV = 'QCODES_FIXTURE_CACHE'
+NO_CACHE_ENV = 'QCODES_FIXTURE_NO_CACHE'
+
+
+def cache_dir() -> str:
+    """
+    The folder holding the cache, configurable via the environment
+    """
+    default = os.path.join(os.path.expanduser('~'), '.cache',
+                           'qcodes_generate_test_db')
+    return os.environ.get(CACHE_DIR_ENV, default)
+
+
+def is_enabled() -> bool:
+    return not os.environ.get(NO_CACHE_ENV)
+
+
+def source_hash(generator: Callable) -> str:
+    """
+    Hash the source code of a generating function, or the source declared as
+    its own, which also covers the helper modules it calls (see
+    utils.generates and fixture_spec.generates)
+    """
+    source = getattr(generator, 'source', None) or inspect.getsource(generator)
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+
+def file_hash(path: str) -> str:
+    """
+    Hash the contents of a file
+    """
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def cache_key(git_hash: str, generator: Callable, *extra) -> str:
+    """
+    The key of the fixtures of a generating function at a git hash. Anything
+    else that the fixtures depend on, e.g. their size or the hashes of the
+    files they are made from, goes in extra.
+    """
+    key = json.dumps([git_hash, source_hash(generator),
+                      getattr(generator, 'seed', None), *extra])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def _entry_path(key: str) -> str:
+    return os.path.join(cache_dir(), key[:2], key)
+
+
+def _sources(key: str, outputs: Sequence[str]) -> List[str]:
+    entry = _entry_path(key)
+    return [os.path.join(entry, *output.split('/')) for output in outputs]
+
+
+def contains(key: str, outputs: Sequence[str]) -> bool:
+    """
+    Whether the outputs (paths relative to the fixture folder) are stored
+    under key, so that restore would restore them
+    """
+    if not outputs or not is_enabled():
+        return False
+    return all(os.path.isfile(source) for source in _sources(key, outputs))
+
+
+def restore(key: str, outputs: Sequence[str], fixturepath: str) -> bool:
+    """
+    Restore the outputs (paths relative to fixturepath) stored under key into
+    fixturepath. Returns whether that was possible.
+    """
+    if not contains(key, outputs):
+        return False
+
+    for output, source in zip(outputs, _sources(key, outputs)):
+        target = os.path.join(fixturepath, *output.split('/'))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copy2(source, target)
+    return True
+
+
+def store(key: str, outputs: Sequence[str], fixturepath: str) -> None:
+    """
+    Store the freshly generated outputs (paths relative to fixturepath) in
+    the cache under key
+    """
+    if not outputs or not is_enabled():
+        return
+
+    entry = _entry_path(key)
+    os.makedirs(os.path.dirname(entry), exist_ok=True)
+
+    # Fill a temporary folder first and move it in place in one go, so that
+    # an interrupted store never leaves a partial entry behind
+    staging = tempfile.mkdtemp(dir=os.path.dirname(entry))
+    try:
+        for output in outputs:
+            source = os.path.join(fixturepath, *output.split('/'))
+            target = os.path.join(staging, *output.split('/'))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copy2(source, target)
+        if os.path.exists(entry):
+            shutil.rmtree(entry)
+        os.replace(staging, entry)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
@@ -0,0 +1,392 @@
+"""
+Declarative specifications of .db-files and the engine generating them.
+
+A FixtureSpec describes a .db-file: the parameters of its runs and how they
+depend on each other, which of them are swept on a grid and measured, the
+number of runs, points and parameters, and the seed. The engine (build)
+generates the file with the API of whatever QCoDeS version is imported, and
+writes the data of the runs in bulk with bulk_data, or, with the --raw
+option, clones a run made with the API with raw_writer.
+
+A generating function for a spec is then just
+
+    @fixture_spec.generates(SOME_RUNS, VERSION)
+    def generate_DB_file_with_some_runs(version=VERSION):
+        fixture_spec.build(SOME_RUNS, version)
+"""
+
+import functools
+import gc
+import inspect
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+from typing import (Any, Callable, Dict, Iterator, List, NamedTuple, Optional,
+                    Tuple, Union)
+
+# NB: it's important that we do not import anything from qcodes here, the
+# engine imports qcodes when it runs
+import utils as utils
+import bulk_data
+import raw_writer
+
+
+class ParamSpec(NamedTuple):
+    """
+    A parameter of the runs, given by the indices of the parameters it is
+    inferred from (basis) and depends on (setpoints)
+    """
+    basis: Tuple[int, ...] = ()
+    setpoints: Tuple[int, ...] = ()
+
+
+class FixtureSpec(NamedTuple):
+    """
+    A .db-file to generate. The parameters are named p0, p1, ... in order.
+    The runs sweep the parameters x and y on a grid and measure the measured
+    parameters at each point, while the constants are (index, value) pairs of
+    parameters that get the same value at each point. If scale asks for more
+    parameters than given, the extra ones are measured on the same grid.
+    Without a scale, the file is an empty database. The runs are spread
+    evenly over the given number of experiments (or as many as there are
+    runs), in order. Of the runs, drawn at random with the seed, the fraction
+    null_descriptions gets a NULL run_description and the fraction
+    empty_descriptions that of a run without parameters, like the runs of
+    real .db-files that came through the upgrades from version 2.
+    """
+    name: str
+    parameters: Tuple[ParamSpec, ...] = ()
+    x: int = 0
+    y: int = 0
+    measured: Tuple[int, ...] = ()
+    constants: Tuple[Tuple[int, Any], ...] = ()
+    scale: Optional[utils.Scale] = None
+    seed: Optional[int] = None
+    experiments: int = 1
+    null_descriptions: float = 0.0
+    empty_descriptions: float = 0.0
+
+
+# A database with no runs
+EMPTY = FixtureSpec(name='empty.db')
+
+# A handful of runs with some interdependent parameters: p4 is measured on a
+# grid of p2 and p3, which are inferred from p0 and p1, respectively, and p0
+# and p1 are set to 0 and 1
+SOME_RUNS = FixtureSpec(
+    name='some_runs.db',
+    parameters=(ParamSpec(),
+                ParamSpec(),
+                ParamSpec(basis=(0,)),
+                ParamSpec(basis=(1,)),
+                ParamSpec(setpoints=(2, 3))),
+    x=2, y=3, measured=(4,),
+    constants=((0, 0), (1, 1)),
+    scale=utils.Scale(runs=10, points=100, params=5),
+    seed=0)
+
+# Many runs of a single point spread over many experiments, for looking up
+# runs rather than reading their data: p2 is measured on a "grid" of p0 and
+# p1. They are too many to be fixtures of the tests, see generates.
+MANY_RUNS = FixtureSpec(
+    name='many_runs.db',
+    parameters=(ParamSpec(),
+                ParamSpec(),
+                ParamSpec(setpoints=(0, 1))),
+    x=0, y=1, measured=(2,),
+    scale=utils.Scale(runs=10000, points=1, params=3),
+    seed=0,
+    experiments=100)
+
+# The length of the chains of inferred parameters of RUN_DESCRIPTIONS
+DEPENDENCY_DEPTH = 10
+
+# Many runs of a single point whose parameters form a deep dependency graph,
+# for the upgrades that rewrite the run_description of every run: p{D-1} and
+# p{2D-1} are each inferred from a chain of D-1 parameters (with D the
+# DEPENDENCY_DEPTH), and p{2D} is measured on a "grid" of them. They are too
+# many to be fixtures of the tests, see generates.
+RUN_DESCRIPTIONS = FixtureSpec(
+    name='run_descriptions.db',
+    parameters=(tuple(ParamSpec(basis=(n - 1,) if n % DEPENDENCY_DEPTH
+                                else ())
+                      for n in range(2 * DEPENDENCY_DEPTH))
+                + (ParamSpec(setpoints=(DEPENDENCY_DEPTH - 1,
+                                        2 * DEPENDENCY_DEPTH - 1)),)),
+    x=DEPENDENCY_DEPTH - 1, y=2 * DEPENDENCY_DEPTH - 1,
+    measured=(2 * DEPENDENCY_DEPTH,),
+    scale=utils.Scale(runs=10000, points=1,
+                      params=2 * DEPENDENCY_DEPTH + 1),
+    seed=0)
+
+# The same with some of the run_descriptions NULL or empty, for the versions
+# that have them
+MIXED_RUN_DESCRIPTIONS = RUN_DESCRIPTIONS._replace(null_descriptions=0.05,
+                                                   empty_descriptions=0.05)
+
+# An empty RunDescriber as QCoDeS serializes it before version 6. Version 4a
+# serializes it with the InterDependencies_ of its bug instead, which is not
+# the empty run_description that the fix of the bug is to be benchmarked on,
+# so the runs of 4a are given this one.
+EMPTY_RUN_DESCRIPTION = '{"interdependencies": {"paramspecs": []}}'
+
+
+def generates(spec: FixtureSpec, version: Union[int, str],
+              scaled_only: bool = False) -> Callable:
+    """
+    Decorator declaring that a generating function builds the spec for the
+    version, like utils.generates. Since the function merely calls the
+    engine, its key in the fixture cache covers the spec and the source of
+    the engine as well.
+    """
+    def decorator(generator: Callable) -> Callable:
+        generator = utils.generates(f'version{version}/{spec.name}',
+                                    seed=spec.seed,
+                                    scale=spec.scale,
+                                    scaled_only=scaled_only)(generator)
+        generator.source = ''.join((generator.source, repr(spec),
+                                    _engine_source()))
+        return generator
+    return decorator
+
+
+@functools.lru_cache(maxsize=None)
+def _engine_source() -> str:
+    """
+    The source of the engine, which is part of the source of every
+    generating function for a spec: all of this module, so that no function
+    the engine calls can be left out, and the helper modules it writes with
+    """
+    return ''.join(inspect.getsource(sys.modules[name])
+                   for name in (__name__, *utils.HELPER_MODULES))
+
+
+def _connect():
+    """
+    The connect function of the QCoDeS at hand, which moved at version 7
+    """
+    try:
+        from qcodes.dataset.sqlite.database import connect
+    except ImportError:
+        from qcodes.dataset.sqlite_base import connect
+    return connect
+
+
+def _new_experiment(path: str, number: int = 1):
+    """
+    Make the number-th experiment of the runs in the .db-file at path. Up to
+    version 2, an Experiment could not be made with a name in one go.
+    """
+    from qcodes.dataset.experiment_container import Experiment
+
+    if 'name' in inspect.signature(Experiment).parameters:
+        return Experiment(path_to_db=path,
+                          name=f'experiment_{number}',
+                          sample_name='no_sample_1')
+    exp = Experiment(path)
+    exp._new(name=f'experiment_{number}', sample_name='no_sample_1')
+    return exp
+
+
+def build(spec: FixtureSpec, version: Union[int, str]) -> str:
+    """
+    Generate the .db-file of a spec in the fixture folder of the version,
+    with the QCoDeS that is imported, and return its path. With the --raw
+    option, only a reference run goes through the QCoDeS API and the runs
+    are written by the raw writer.
+    """
+
+    # This function will run often on CI and re-generate the .db-files
+    # That should ideally be a deterministic action
+    # (although this hopefully plays no role)
+    if spec.seed is not None:
+        import numpy as np
+        np.random.seed(spec.seed)
+
+    vNfixturepath = os.path.join(utils.fixturepath, f'version{version}')
+    os.makedirs(vNfixturepath, exist_ok=True)
+    name = spec.name if spec.scale is None else utils.scaled_name(spec.name,
+                                                                  spec.scale)
+    path = os.path.join(vNfixturepath, name)
+
+    if os.path.exists(path):
+        os.remove(path)
+
+    if spec.scale is None:
+        _connect()(path)
+    elif utils.raw_writes():
+        _write_raw(spec, path, utils.get_scale(spec.scale))
+    else:
+        _write(spec, path, utils.get_scale(spec.scale))
+
+    if spec.null_descriptions or spec.empty_descriptions:
+        _mix_descriptions(spec, path, utils.get_scale(spec.scale).runs,
+                          version)
+
+    return path
+
+
+def _measured(spec: FixtureSpec, scale: utils.Scale) -> Tuple[int, ...]:
+    """
+    The indices of the measured parameters of a spec at a scale
+    """
+    return spec.measured + tuple(range(len(spec.parameters), scale.params))
+
+
+def _experiments(spec: FixtureSpec, scale: utils.Scale) -> int:
+    """
+    The number of experiments of a spec at a scale, which has at least a run
+    in each
+    """
+    return min(spec.experiments, scale.runs)
+
+
+def _write(spec: FixtureSpec, path: str, scale: utils.Scale) -> None:
+    """
+    Write the runs of a spec to a new .db-file with the QCoDeS API
+    """
+    from qcodes.dataset.measurements import Measurement
+    from qcodes import Parameter
+
+    _connect()(path)
+
+    params = []
+    for n in range(max(scale.params, len(spec.parameters))):
+        params.append(Parameter(f'p{n}', label=f'Parameter {n}',
+                                unit=f'unit {n}', set_cmd=None, get_cmd=None))
+
+    measured = [params[i] for i in _measured(spec, scale)]
+    constants = [(params[i], value) for i, value in spec.constants]
+
+    sizes = raw_writer.runs_per_experiment(scale.runs,
+                                           _experiments(spec, scale))
+    for number, runs in enumerate(sizes, start=1):
+        meas = Measurement(_new_experiment(path, number))
+        for param, param_spec in zip(params, spec.parameters):
+            kwargs = {}
+            if param_spec.basis:
+                kwargs['basis'] = tuple(params[i] for i in param_spec.basis)
+            if param_spec.setpoints:
+                kwargs['setpoints'] = tuple(params[i]
+                                            for i in param_spec.setpoints)
+            meas.register_parameter(param, **kwargs)
+
+        for param in params[len(spec.parameters):]:
+            meas.register_parameter(param,
+                                    setpoints=(params[spec.x],
+                                               params[spec.y]))
+
+        for _ in range(runs):
+            with meas.run() as datasaver:
+                bulk_data.add_grid_results(datasaver,
+                                           params[spec.x], params[spec.y],
+                                           measured, scale.points,
+                                           constants=constants)
+
+
+def _grid_data(spec: FixtureSpec,
+               scale: utils.Scale) -> Iterator[Dict[str, Any]]:
+    """
+    The data of a run of a spec, in chunks mapping columns to values, as
+    _write would add it
+    """
+    measured = [f'p{i}' for i in _measured(spec, scale)]
+    nx, ny = bulk_data.grid_shape(scale.points)
+    for x, y, *zs in bulk_data.iter_grid_values(nx, ny, len(measured)):
+        chunk = {f'p{i}': value for i, value in spec.constants}
+        chunk[f'p{spec.x}'] = x
+        chunk[f'p{spec.y}'] = y
+        chunk.update(zip(measured, zs))
+        yield chunk
+
+
+def _write_raw(spec: FixtureSpec, path: str, scale: utils.Scale) -> None:
+    """
+    Write the runs of a spec to a new .db-file with the raw writer, cloning a
+    run of a single point written with the QCoDeS API
+    """
+    folder = tempfile.mkdtemp(prefix='qcodes_reference_')
+    try:
+        reference = os.path.join(folder, 'reference.db')
+        _write(spec._replace(experiments=1), reference,
+               scale._replace(runs=1, points=1))
+        # Connections that QCoDeS left behind are closed when collected
+        gc.collect()
+
+        # The data of all runs is drawn anew, as _write would have drawn it
+        if spec.seed is not None:
+            import numpy as np
+            np.random.seed(spec.seed)
+        raw_writer.clone_runs(reference, path, scale.runs,
+                              lambda: _grid_data(spec, scale),
+                              experiments=_experiments(spec, scale))
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def _empty_description() -> str:
+    """
+    The run_description that the QCoDeS at hand gives a run without
+    parameters, i.e. an empty RunDescriber
+    """
+    from qcodes.dataset.measurements import Measurement
+
+    folder = tempfile.mkdtemp(prefix='qcodes_reference_')
+    try:
+        path = os.path.join(folder, 'empty_description.db')
+        _connect()(path)
+        with Measurement(_new_experiment(path)).run():
+            pass
+        # Connections that QCoDeS left behind are closed when collected
+        gc.collect()
+        conn = sqlite3.connect(path)
+        try:
+            return conn.execute('SELECT run_description FROM runs'
+                                ).fetchone()[0]
+        finally:
+            conn.close()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def _described_runs(spec: FixtureSpec, runs: int) -> Tuple[List[int],
+                                                           List[int]]:
+    """
+    The run ids of the runs of a spec that get a NULL and an empty
+    run_description, drawn with its seed
+    """
+    run_ids = list(range(1, runs + 1))
+    random.Random(spec.seed).shuffle(run_ids)
+    nulls = round(runs * spec.null_descriptions)
+    empties = round(runs * spec.empty_descriptions)
+    if nulls + empties > runs:
+        raise ValueError(f'{spec.name} can not have more NULL and empty '
+                         'run_descriptions than runs')
+    return sorted(run_ids[:nulls]), sorted(run_ids[nulls:nulls + empties])
+
+
+def _mix_descriptions(spec: FixtureSpec, path: str, runs: int,
+                      version: Union[int, str]) -> None:
+    """
+    Replace the run_descriptions of the runs of a spec that are to be NULL or
+    empty in the .db-file at path
+    """
+    nulls, empties = _described_runs(spec, runs)
+    empty = (EMPTY_RUN_DESCRIPTION if version == '4a'
+             else _empty_description())
+
+    conn = sqlite3.connect(path)
+    try:
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(runs)')]
+        if 'run_description' not in columns:
+            raise ValueError(f'The runs of {path} have no run_description')
+        with conn:
+            conn.executemany('UPDATE runs SET run_description=? '
+                             'WHERE run_id=?',
+                             [(None, run_id) for run_id in nulls]
+                             + [(empty, run_id) for run_id in empties])
+    finally:
+        conn.close()
@@ -0,0 +1,173 @@
+"""
+Generate the database files of all versions in parallel.
+
+Each version in utils.GIT_HASHES gets its own git worktree, and the generating
+functions run in fresh processes that import QCoDeS from the worktree of their
+version. With --from-git-objects, no worktrees are made and QCoDeS is imported
+straight from the git objects instead. Either way, the editable QCoDeS
+repository itself is never checked out, so the versions can run concurrently.
+
+The generating functions are scheduled as a graph of the files they read and
+write, see scheduler.py.
+
+With --watch, the generation runs again whenever a generate_version_*.py
+script or a module of the generating functions (bulk_data.py, raw_writer.py,
+fixture_spec.py) changes, with the fork server of the scheduler kept warm in
+between. Only the generators whose fixtures went out of date in the cache run.
+When any other module changes, e.g. utils.py or db_tools.py, which the fork
+server has already imported, it stops and has to be started again.
+
+With --verify, the fixtures are first checked against the manifests of their
+version folders (see manifest.py), and only the generating functions of the
+fixtures that are missing, stale or damaged are run, along with those of the
+fixtures made from them.
+
+With --list, the generating functions and the files they read and write are
+listed, and with --plan, what would be restored from the cache and what would
+run is printed, without generating anything. Neither these nor a run that only
+restores fixtures touches git or imports qcodes or NumPy, so that e.g.
+
+    python generate_all.py --verify --plan
+
+checks all fixtures in well under a second, and fails if any does not match.
+"""
+
+import argparse
+import multiprocessing
+import shutil
+import sys
+import tempfile
+from typing import List
+
+# NB: it's important that we do not import anything from qcodes in this
+# process, the generators import qcodes in the processes of the pool
+import utils as utils
+import manifest
+import scheduler
+
+
+def failing_nodes(nodes: List[scheduler.Node]) -> List[scheduler.Node]:
+    """
+    The nodes with fixtures that fail verification against their manifests,
+    and the nodes that read those fixtures, directly or not
+    """
+    fixtures = [(utils.output_path(output), utils.GIT_HASHES[node.version],
+                 scheduler.generator_of(node))
+                for node in nodes for output in node.outputs]
+    problems = manifest.verify(fixtures)
+
+    failing = []
+    for node in nodes:
+        node_problems = [(output, problems[utils.output_path(output)])
+                         for output in node.outputs
+                         if utils.output_path(output) in problems]
+        for output, problem in node_problems:
+            print(f'{output}: {problem}')
+        if node_problems:
+            failing.append(node)
+
+    # Whatever was made from a fixture that is regenerated is stale too
+    deps = scheduler.dependencies(nodes)
+    stale = set(failing)
+    while True:
+        dependents = {node for node in nodes
+                      if node not in stale and deps[node] & stale}
+        if not dependents:
+            break
+        for node in dependents:
+            print(f'{node.generator} of version {node.version}: reads '
+                  'fixtures that are to be generated again')
+        stale |= dependents
+    return [node for node in nodes if node in stale]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('versions', nargs='*', type=utils.parse_version,
+                        help='versions to generate (default: all)')
+    parser.add_argument('-j', '--jobs', type=int,
+                        default=multiprocessing.cpu_count(),
+                        help='number of generators to run concurrently')
+    parser.add_argument('--worktree-dir',
+                        help='folder to put the worktrees in (default: a '
+                             'temporary folder)')
+    parser.add_argument('--verify', action='store_true',
+                        help='only run the generators of fixtures that do '
+                             'not match their manifest')
+    parser.add_argument('--list', action='store_true',
+                        help='list the generating functions and the files '
+                             'they read and write, and exit')
+    parser.add_argument('--plan', action='store_true',
+                        help='print which generating functions would run and '
+                             'which would be restored from the cache, and '
+                             'exit (with --verify, fail if any fixture does '
+                             'not match its manifest)')
+    parser.add_argument('--watch', action='store_true',
+                        help='generate again whenever a generating function '
+                             'changes (stops when any other module changes, '
+                             'e.g. utils.py or db_tools.py, which needs a '
+                             'restart)')
+    utils.add_arguments(parser)
+    args = parser.parse_args(argv)
+    utils.apply_arguments(args)
+
+    while True:
+        result = generate(args)
+        if not args.watch:
+            return result
+        print('Waiting for changes...')
+        changed = scheduler.wait_for_changes()
+        stale = scheduler.not_reloadable(changed)
+        if stale:
+            print(f'{stale} changed, which the fork server can not reload, '
+                  'start again to generate with the changes')
+            return 1
+        print(f'{changed} changed, generating again')
+        scheduler.reload_generators()
+
+
+def generate(args: argparse.Namespace) -> int:
+    """
+    Generate the fixtures asked for on the command line once
+    """
+    nodes = scheduler.discover(args.versions or None)
+    if args.list:
+        for node in nodes:
+            print(f'{node.version!s:<3} {node.generator}')
+            for input_ in node.inputs:
+                print(f'      reads  {input_}')
+            for output in node.outputs:
+                print(f'      writes {output}')
+        return 0
+
+    if args.verify:
+        nodes = failing_nodes(nodes)
+        if not nodes:
+            print('All fixtures match their manifests')
+            return 0
+
+    if args.plan:
+        for node, action in scheduler.plan(nodes).items():
+            print(f'{action:<8} {node.generator} of version {node.version}')
+        # with --verify, the nodes left are those of fixtures that failed
+        return 1 if args.verify else 0
+
+    worktree_dir = args.worktree_dir or tempfile.mkdtemp(
+        prefix='qcodes_worktrees_')
+    try:
+        failed = scheduler.run(nodes, args.jobs, worktree_dir)
+    finally:
+        if args.worktree_dir is None:
+            shutil.rmtree(worktree_dir, ignore_errors=True)
+
+    utils.print_report()
+
+    if failed:
+        print('Generation failed for '
+              f'{[(node.version, node.generator) for node in failed]}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,6 +6,7 @@ import os
 # do the git magic (which we do below), hence the relative import here
 import utils as utils
 
+@utils.generates('version0/empty.db')
 def generate_empty_DB_file():
     """
     Generate the bare minimal DB file with no runs
@@ -24,9 +25,10 @@ def generate_empty_DB_file():
     sqlite_base.init_db(conn)
 
 
-if __name__ == '__main__':
+GENERATORS = (generate_empty_DB_file,)
+
 
-    gens = (generate_empty_DB_file,)
+if __name__ == '__main__':
 
     # pylint: disable=E1101
-    utils.checkout_to_old_version_and_run_generators(version=0, gens=gens)
+    utils.main(version=0, gens=GENERATORS)
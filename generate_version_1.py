@@ -5,8 +5,10 @@ import os
 # NB: it's important that we do not import anything from qcodes before we
 # do the git magic (which we do below), hence the relative import here
 import utils as utils
+import fixture_spec
 
 
+@utils.generates('version1/empty.db')
 def generate_empty_DB_file():
     """
     Generate the bare minimal DB file with no runs
@@ -23,9 +25,20 @@ def generate_empty_DB_file():
     sqlite_base.connect(path)
 
 
-if __name__ == '__main__':
+@fixture_spec.generates(fixture_spec.MANY_RUNS, 1, scaled_only=True)
+def generate_DB_file_with_many_runs():
+    """
+    Generate a .db-file with many runs over many experiments, to benchmark
+    looking them up before the indexes of version 2
+    """
+    fixture_spec.build(fixture_spec.MANY_RUNS, 1)
+
 
-    gens = (generate_empty_DB_file,)
+GENERATORS = (generate_empty_DB_file,
+              generate_DB_file_with_many_runs)
+
+
+if __name__ == '__main__':
 
     # pylint: disable=E1101
-    utils.checkout_to_old_version_and_run_generators(version=1, gens=gens)
+    utils.main(version=1, gens=GENERATORS)
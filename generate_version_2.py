@@ -1,12 +1,13 @@
 # Generate version 2 database files for qcodes' test suite to consume
 
 import os
-import numpy as np
 
 # NB: it's important that we do not import anything from qcodes before we
 # do the git magic (which we do below), hence the relative import here
 import utils as utils
+import fixture_spec
 
+@utils.generates('version2/empty.db')
 def generate_empty_DB_file():
     """
     Generate the bare minimal DB file with no runs
@@ -24,63 +25,29 @@ def generate_empty_DB_file():
     sqlite_base.connect(path)
 
 
+# The runs of version 2 have one more parameter, and p3 is inferred from both
+# p0 and p1
+SOME_RUNS = fixture_spec.SOME_RUNS._replace(
+    parameters=(fixture_spec.ParamSpec(),
+                fixture_spec.ParamSpec(),
+                fixture_spec.ParamSpec(basis=(0,)),
+                fixture_spec.ParamSpec(basis=(1, 0)),
+                fixture_spec.ParamSpec(setpoints=(2, 3)),
+                fixture_spec.ParamSpec(basis=(0,))),
+    constants=(),
+    scale=utils.Scale(runs=10, points=100, params=6))
+
+
+@fixture_spec.generates(SOME_RUNS, 2)
 def generate_DB_file_with_some_runs():
     """
     Generate a .db-file with a handful of runs with some interdependent
     parameters
     """
-
-    # This function will run often on CI and re-generate the .db-files
-    # That should ideally be a deterministic action
-    # (although this hopefully plays no role)
-    np.random.seed(0)
-
-    v2fixturepath = os.path.join(utils.fixturepath, 'version2')
-    os.makedirs(v2fixturepath, exist_ok=True)
-    path = os.path.join(v2fixturepath, 'some_runs.db')
-
-    if os.path.exists(path):
-        os.remove(path)
-
-    from qcodes.dataset.sqlite_base import connect
-    from qcodes.dataset.measurements import Measurement
-    from qcodes.dataset.experiment_container import Experiment
-    from qcodes import Parameter
-
-    connect(path)
-    exp = Experiment(path)
-    exp._new(name='experiment_1', sample_name='no_sample_1')
-
-    # Now make some parameters to use in measurements
-    params = []
-    for n in range(6):
-        params.append(Parameter(f'p{n}', label=f'Parameter {n}',
-                                unit=f'unit {n}', set_cmd=None, get_cmd=None))
-
-    # Set up an experiment
-
-    meas = Measurement(exp)
-    meas.register_parameter(params[0])
-    meas.register_parameter(params[1])
-    meas.register_parameter(params[2], basis=(params[0],))
-    meas.register_parameter(params[3], basis=(params[1], params[0]))
-    meas.register_parameter(params[4], setpoints=(params[2], params[3])),
-    meas.register_parameter(params[5], basis=(params[0],))
-
-    # Make a number of identical runs
-
-    for _ in range(10):
-
-        with meas.run() as datasaver:
-
-            for x in np.random.rand(10):
-                for y in np.random.rand(10):
-                    z = np.random.rand()
-                    datasaver.add_result((params[2], x),
-                                         (params[3], y),
-                                         (params[4], z))
+    fixture_spec.build(SOME_RUNS, 2)
 
 
+@utils.generates('version2/empty_runs.db')
 def generate_DB_file_with_empty_runs():
     """
     Generate a DB file that holds empty runs and runs with no interdependencies
@@ -132,11 +99,32 @@ def generate_DB_file_with_empty_runs():
             datasaver.add_result(*res)
 
 
-if __name__ == '__main__':
+@fixture_spec.generates(fixture_spec.MANY_RUNS, 2, scaled_only=True)
+def generate_DB_file_with_many_runs():
+    """
+    Generate a .db-file with many runs over many experiments, indexed by
+    exp_id and GUID from the start
+    """
+    fixture_spec.build(fixture_spec.MANY_RUNS, 2)
+
+
+@fixture_spec.generates(fixture_spec.RUN_DESCRIPTIONS, 2, scaled_only=True)
+def generate_DB_file_with_deep_dependencies():
+    """
+    Generate a .db-file with many runs of deeply interdependent parameters,
+    to benchmark making their run_descriptions in the 2->3 upgrade
+    """
+    fixture_spec.build(fixture_spec.RUN_DESCRIPTIONS, 2)
+
+
+GENERATORS = (generate_empty_DB_file,
+              generate_DB_file_with_some_runs,
+              generate_DB_file_with_empty_runs,
+              generate_DB_file_with_many_runs,
+              generate_DB_file_with_deep_dependencies)
 
-    gens = (generate_empty_DB_file,
-            generate_DB_file_with_some_runs,
-            generate_DB_file_with_empty_runs)
+
+if __name__ == '__main__':
 
     # pylint: disable=E1101
-    utils.checkout_to_old_version_and_run_generators(version=2, gens=gens)
+    utils.main(version=2, gens=GENERATORS)
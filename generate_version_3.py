@@ -1,15 +1,17 @@
 # Generate version 3 database files for qcodes' test suite to consume
 
 import os
-import shutil
-import numpy as np
 
 # NB: it's important that we do not import anything from qcodes before we
 # do the git magic (which we do below), hence the relative import here
 import utils as utils
+import bulk_data
+import fixture_spec
+import db_tools
 
 
 
+@utils.generates('version3/empty.db')
 def generate_empty_DB_file():
     """
     Generate the bare minimal DB file with no runs
@@ -27,63 +29,20 @@ def generate_empty_DB_file():
     sqlite_base.connect(path)
 
 
+# Version 3 did not store the values of the basis parameters
+SOME_RUNS = fixture_spec.SOME_RUNS._replace(constants=())
+
+
+@fixture_spec.generates(SOME_RUNS, 3)
 def generate_DB_file_with_some_runs():
     """
     Generate a .db-file with a handful of runs with some interdependent
     parameters
     """
-
-    # This function will run often on CI and re-generate the .db-files
-    # That should ideally be a deterministic action
-    # (although this hopefully plays no role)
-    np.random.seed(0)
-
-    v3fixturepath = os.path.join(utils.fixturepath, 'version3')
-    os.makedirs(v3fixturepath, exist_ok=True)
-    path = os.path.join(v3fixturepath, 'some_runs.db')
-
-    if os.path.exists(path):
-        os.remove(path)
-
-    from qcodes.dataset.sqlite_base import connect
-    from qcodes.dataset.measurements import Measurement
-    from qcodes.dataset.experiment_container import Experiment
-    from qcodes import Parameter
-
-    connect(path)
-    exp = Experiment(path_to_db=path,
-                     name='experiment_1',
-                     sample_name='no_sample_1')
-
-    # Now make some parameters to use in measurements
-    params = []
-    for n in range(5):
-        params.append(Parameter(f'p{n}', label=f'Parameter {n}',
-                                unit=f'unit {n}', set_cmd=None, get_cmd=None))
-
-    # Set up an experiment
-
-    meas = Measurement(exp)
-    meas.register_parameter(params[0])
-    meas.register_parameter(params[1])
-    meas.register_parameter(params[2], basis=(params[0],))
-    meas.register_parameter(params[3], basis=(params[1],))
-    meas.register_parameter(params[4], setpoints=(params[2], params[3]))
-
-    # Make a number of identical runs
-
-    for _ in range(10):
-
-        with meas.run() as datasaver:
-
-            for x in np.random.rand(10):
-                for y in np.random.rand(10):
-                    z = np.random.rand()
-                    datasaver.add_result((params[2], x),
-                                         (params[3], y),
-                                         (params[4], z))
+    fixture_spec.build(SOME_RUNS, 3)
 
 
+@utils.generates('version3/some_runs_without_run_description.db', seed=0)
 def generate_DB_file_with_some_runs_having_not_run_descriptions():
     """
     Generate a .db-file with a handful of runs some of which lack run
@@ -95,6 +54,9 @@ def generate_DB_file_with_some_runs_having_not_run_descriptions():
         #3: run with parameters but run description is empty RunDescriber
         #4: run without parameters but run description is NULL
     """
+    import numpy as np
+    np.random.seed(0)
+
     v3fixturepath = os.path.join(utils.fixturepath, 'version3')
     os.makedirs(v3fixturepath, exist_ok=True)
     path = os.path.join(v3fixturepath, 'some_runs_without_run_description.db')
@@ -137,12 +99,11 @@ def generate_DB_file_with_some_runs_having_not_run_descriptions():
 
         with meas.run() as datasaver:
 
-            for x in np.random.rand(10):
-                for y in np.random.rand(10):
-                    z = np.random.rand()
-                    datasaver.add_result((params[2], x),
-                                         (params[3], y),
-                                         (params[4], z))
+            x, y, z = bulk_data.grid_values(10, 10)
+            bulk_data.add_results(datasaver,
+                                  (params[2], x),
+                                  (params[3], y),
+                                  (params[4], z))
 
         run_ids.append(datasaver.run_id)
 
@@ -186,6 +147,8 @@ def generate_DB_file_with_some_runs_having_not_run_descriptions():
     conn.commit()  # just to be sure
 
 
+@utils.generates('version3/some_runs_upgraded_2.db',
+                 inputs=('version2/some_runs.db',))
 def generate_upgraded_v2_runs():
     """
     Generate some runs by upgradeing from v2 db. This
@@ -197,16 +160,29 @@ def generate_upgraded_v2_runs():
     v2fixture_path = os.path.join(utils.fixturepath, 'version2', 'some_runs.db')
     v3fixturepath = os.path.join(utils.fixturepath, 'version3',
                                  'some_runs_upgraded_2.db')
-    shutil.copy2(v2fixture_path, v3fixturepath)
+    db_tools.copy_database(v2fixture_path, v3fixturepath)
     sqlite_base.connect(v3fixturepath)
 
 
-if __name__ == '__main__':
+@fixture_spec.generates(fixture_spec.MIXED_RUN_DESCRIPTIONS, 3,
+                        scaled_only=True)
+def generate_DB_file_with_many_run_descriptions():
+    """
+    Generate a .db-file with many runs of deeply interdependent parameters,
+    some with NULL or empty run descriptions like in
+    some_runs_without_run_description.db, to benchmark the 3->4 upgrade
+    """
+    fixture_spec.build(fixture_spec.MIXED_RUN_DESCRIPTIONS, 3)
+
+
+GENERATORS = (generate_empty_DB_file,
+              generate_DB_file_with_some_runs_having_not_run_descriptions,
+              generate_DB_file_with_some_runs,
+              generate_upgraded_v2_runs,
+              generate_DB_file_with_many_run_descriptions)
 
-    gens = (generate_empty_DB_file,
-            generate_DB_file_with_some_runs_having_not_run_descriptions,
-            generate_DB_file_with_some_runs,
-            generate_upgraded_v2_runs)
+
+if __name__ == '__main__':
 
     # pylint: disable=E1101
-    utils.checkout_to_old_version_and_run_generators(version=3, gens=gens)
+    utils.main(version=3, gens=GENERATORS)
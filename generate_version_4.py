@@ -3,13 +3,14 @@ Generate a version 4 database file for qcodes' test suite to consume.
 """
 
 import os
-import numpy as np
 
 # NB: it's important that we do not import anything from qcodes before we
 # do the git magic (which we do below), hence the relative import here
 import utils as utils
+import bulk_data
 
 
+@utils.generates('version4/empty.db')
 def generate_empty_DB_file():
     """
     Generate an empty DB file with no runs
@@ -27,6 +28,13 @@ def generate_empty_DB_file():
     sqlite_base.connect(path)
 
 
+# The size of with_runs_but_no_snapshots.db, which can be changed with the
+# --scale option
+NO_SNAPSHOTS_SCALE = utils.Scale(runs=4, points=16, params=4)
+
+
+@utils.generates('version4/with_runs_but_no_snapshots.db',
+                 seed=0, scale=NO_SNAPSHOTS_SCALE)
 def generate_DB_file_with_runs_but_no_snapshots():
     """
     Generate a .db-file with a handful of runs without snapshots
@@ -35,11 +43,16 @@ def generate_DB_file_with_runs_but_no_snapshots():
     # This function will run often on CI and re-generate the .db-files
     # That should ideally be a deterministic action
     # (although this hopefully plays no role)
+    import numpy as np
     np.random.seed(0)
 
+    scale = utils.get_scale(NO_SNAPSHOTS_SCALE)
+
     v4fixturepath = os.path.join(utils.fixturepath, 'version4')
     os.makedirs(v4fixturepath, exist_ok=True)
-    path = os.path.join(v4fixturepath, 'with_runs_but_no_snapshots.db')
+    path = os.path.join(v4fixturepath,
+                        utils.scaled_name('with_runs_but_no_snapshots.db',
+                                          NO_SNAPSHOTS_SCALE))
 
     if os.path.exists(path):
         os.remove(path)
@@ -60,7 +73,7 @@ def generate_DB_file_with_runs_but_no_snapshots():
 
     # Now make some parameters to use in measurements
     params = []
-    for n in range(4):
+    for n in range(scale.params):
         params.append(Parameter(f'p{n}', label=f'Parameter {n}',
                                 unit=f'unit {n}', set_cmd=None, get_cmd=None))
 
@@ -74,22 +87,24 @@ def generate_DB_file_with_runs_but_no_snapshots():
     meas.register_parameter(params[2], basis=(params[1],))
     meas.register_parameter(params[3], setpoints=(params[1], params[2]))
 
+    # Any further parameters depend on the same setpoints
+    for param in params[4:]:
+        meas.register_parameter(param, setpoints=(params[1], params[2]))
+
     # Make a number of identical runs
 
-    for _ in range(4):
+    for _ in range(scale.runs):
 
         with meas.run() as datasaver:
 
-            for x in np.random.rand(4):
-                for y in np.random.rand(4):
-                    z = np.random.rand()
-                    datasaver.add_result((params[1], x),
-                                         (params[2], y),
-                                         (params[3], z))
+            bulk_data.add_grid_results(datasaver,
+                                       params[1], params[2], params[3:],
+                                       scale.points)
 
     assert not is_column_in_table(conn, 'runs', 'snapshot')
 
 
+@utils.generates('version4/with_runs_and_snapshots.db', seed=0)
 def generate_DB_file_with_runs_and_snapshots():
     """
     Generate a .db-file with a handful of runs some of which have snapshots.
@@ -99,6 +114,9 @@ def generate_DB_file_with_runs_and_snapshots():
         #2: run with a snapshot of an empty station
         #3: run without a snapshot
     """
+    import numpy as np
+    np.random.seed(0)
+
     v4fixturepath = os.path.join(utils.fixturepath, 'version4')
     os.makedirs(v4fixturepath, exist_ok=True)
     path = os.path.join(v4fixturepath, 'with_runs_and_snapshots.db')
@@ -140,12 +158,11 @@ def generate_DB_file_with_runs_and_snapshots():
 
     with meas.run() as datasaver:
 
-        for x in np.random.rand(4):
-            for y in np.random.rand(4):
-                z = np.random.rand()
-                datasaver.add_result((params[1], x),
-                                     (params[2], y),
-                                     (params[3], z))
+        x, y, z = bulk_data.grid_values(4, 4)
+        bulk_data.add_results(datasaver,
+                              (params[1], x),
+                              (params[2], y),
+                              (params[3], z))
 
     run_ids.append(datasaver.run_id)
 
@@ -162,12 +179,11 @@ def generate_DB_file_with_runs_and_snapshots():
 
     with meas.run() as datasaver:
 
-        for x in np.random.rand(4):
-            for y in np.random.rand(4):
-                z = np.random.rand()
-                datasaver.add_result((params[1], x),
-                                     (params[2], y),
-                                     (params[3], z))
+        x, y, z = bulk_data.grid_values(4, 4)
+        bulk_data.add_results(datasaver,
+                              (params[1], x),
+                              (params[2], y),
+                              (params[3], z))
 
     run_ids.append(datasaver.run_id)
 
@@ -183,12 +199,11 @@ def generate_DB_file_with_runs_and_snapshots():
 
     with meas.run() as datasaver:
 
-        for x in np.random.rand(4):
-            for y in np.random.rand(4):
-                z = np.random.rand()
-                datasaver.add_result((params[1], x),
-                                     (params[2], y),
-                                     (params[3], z))
+        x, y, z = bulk_data.grid_values(4, 4)
+        bulk_data.add_results(datasaver,
+                              (params[1], x),
+                              (params[2], y),
+                              (params[3], z))
 
     run_ids.append(datasaver.run_id)
 
@@ -202,11 +217,12 @@ def generate_DB_file_with_runs_and_snapshots():
     assert is_column_in_table(conn, 'runs', 'snapshot')
 
 
-if __name__ == '__main__':
+GENERATORS = (generate_empty_DB_file,
+              generate_DB_file_with_runs_but_no_snapshots,
+              generate_DB_file_with_runs_and_snapshots)
 
-    gens = (generate_empty_DB_file,
-            generate_DB_file_with_runs_but_no_snapshots,
-            generate_DB_file_with_runs_and_snapshots)
+
+if __name__ == '__main__':
 
     # pylint: disable=E1101
-    utils.checkout_to_old_version_and_run_generators(version=4, gens=gens)
+    utils.main(version=4, gens=GENERATORS)
@@ -5,76 +5,38 @@ Version 4a accidentally serialised the RunDescriber with an InterDependencies_
 object instead of an InterDependencies object
 """
 
-import os
-import numpy as np
-
 # NB: it's important that we do not import anything from qcodes before we
 # do the git magic (which we do below), hence the relative import here
 import utils as utils
+import fixture_spec
 
 
+@fixture_spec.generates(fixture_spec.SOME_RUNS, '4a')
 def generate_DB_file_with_some_runs():
     """
     Generate a .db-file with a handful of runs with some interdependent
     parameters
     """
+    fixture_spec.build(fixture_spec.SOME_RUNS, '4a')
 
-    # This function will run often on CI and re-generate the .db-files
-    # That should ideally be a deterministic action
-    # (although this hopefully plays no role)
-    np.random.seed(0)
-
-    v4afixturepath = os.path.join(utils.fixturepath, 'version4a')
-    os.makedirs(v4afixturepath, exist_ok=True)
-    path = os.path.join(v4afixturepath, 'some_runs.db')
-
-    if os.path.exists(path):
-        os.remove(path)
-
-    from qcodes.dataset.sqlite_base import connect
-    from qcodes.dataset.measurements import Measurement
-    from qcodes.dataset.experiment_container import Experiment
-    from qcodes import Parameter
-
-    connect(path)
-    exp = Experiment(path_to_db=path,
-                     name='experiment_1',
-                     sample_name='no_sample_1')
-
-    # Now make some parameters to use in measurements
-    params = []
-    for n in range(5):
-        params.append(Parameter(f'p{n}', label=f'Parameter {n}',
-                                unit=f'unit {n}', set_cmd=None, get_cmd=None))
 
-    # Set up an experiment
-
-    meas = Measurement(exp)
-    meas.register_parameter(params[0])
-    meas.register_parameter(params[1])
-    meas.register_parameter(params[2], basis=(params[0],))
-    meas.register_parameter(params[3], basis=(params[1],))
-    meas.register_parameter(params[4], setpoints=(params[2], params[3]))
-
-    # Make a number of identical runs
-
-    for _ in range(10):
+@fixture_spec.generates(fixture_spec.MIXED_RUN_DESCRIPTIONS, '4a',
+                        scaled_only=True)
+def generate_DB_file_with_many_run_descriptions():
+    """
+    Generate a .db-file with many runs of deeply interdependent parameters,
+    with the buggy run descriptions of version 4a but for some NULL ones and
+    some of an empty RunDescriber in the format that the fix of the bug
+    expects (see fixture_spec.EMPTY_RUN_DESCRIPTION), to benchmark the fix
+    """
+    fixture_spec.build(fixture_spec.MIXED_RUN_DESCRIPTIONS, '4a')
 
-        with meas.run() as datasaver:
 
-            for x in np.random.rand(10):
-                for y in np.random.rand(10):
-                    z = np.random.rand()
-                    datasaver.add_result((params[0], 0),
-                                         (params[1], 1),
-                                         (params[2], x),
-                                         (params[3], y),
-                                         (params[4], z))
+GENERATORS = (generate_DB_file_with_some_runs,
+              generate_DB_file_with_many_run_descriptions)
 
 
 if __name__ == '__main__':
 
-    gens = (generate_DB_file_with_some_runs,)
-
     # pylint: disable=E1101
-    utils.checkout_to_old_version_and_run_generators(version='4a', gens=gens)
+    utils.main(version='4a', gens=GENERATORS)
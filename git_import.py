@@ -0,0 +1,127 @@
+"""
+Import a package straight from the git object database of a repository.
+
+The GitImporter finds and loads the modules of a package as they are in the
+tree of a given commit, so that code from an old commit can be imported
+without checking that commit out. Only the package data that is not Python
+source (e.g. the JSON files of the QCoDeS config) is written to a temporary
+folder, since such files are read from disk relative to the __file__ of the
+modules.
+"""
+
+import importlib.abc
+import importlib.machinery
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from git import Repo
+
+
+class GitImporter(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    """
+    A meta path finder and loader serving the modules of a package from the
+    tree of a commit
+
+    Args:
+        repo: The repository holding the package
+        commit: The commit (or anything git can resolve to one) to import from
+        package: The name of the top-level package to serve
+        datadir: The folder to write the package data to and to which the
+            __file__ of the served modules point
+    """
+
+    def __init__(self, repo: Repo, commit: str, package: str,
+                 datadir: str) -> None:
+        self.package = package
+        self.datadir = datadir
+        self._blobs: Dict[str, object] = {}
+
+        tree = repo.commit(commit).tree
+        for item in tree[package].traverse():
+            if item.type != 'blob':
+                continue
+            if item.path.endswith('.py'):
+                self._blobs[item.path] = item
+            elif not item.path.startswith(f'{package}/tests/'):
+                target = self._filename(item.path)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, 'wb') as f:
+                    item.stream_data(f)
+
+    def _filename(self, path: str) -> str:
+        return os.path.join(self.datadir, *path.split('/'))
+
+    def find_spec(self, fullname: str, path=None, target=None
+                  ) -> Optional[importlib.machinery.ModuleSpec]:
+        if fullname != self.package and \
+                not fullname.startswith(self.package + '.'):
+            return None
+
+        base = fullname.replace('.', '/')
+        if f'{base}/__init__.py' in self._blobs:
+            spec = importlib.util.spec_from_file_location(
+                fullname, self._filename(f'{base}/__init__.py'), loader=self,
+                submodule_search_locations=[self._filename(base)])
+        elif f'{base}.py' in self._blobs:
+            spec = importlib.util.spec_from_file_location(
+                fullname, self._filename(f'{base}.py'), loader=self)
+        else:
+            return None
+        return spec
+
+    def _path_of(self, filename: str) -> str:
+        relpath = os.path.relpath(filename, self.datadir)
+        return relpath.replace(os.sep, '/')
+
+    def get_source(self, fullname: str) -> str:
+        spec = self.find_spec(fullname)
+        if spec is None:
+            raise ImportError(f'{fullname} is not served by this importer',
+                              name=fullname)
+        blob = self._blobs[self._path_of(spec.origin)]
+        return blob.data_stream.read().decode('utf-8')
+
+    def create_module(self, spec):
+        # default module creation
+        return None
+
+    def exec_module(self, module) -> None:
+        source = self.get_source(module.__name__)
+        code = compile(source, module.__file__, 'exec', dont_inherit=True)
+        exec(code, module.__dict__)
+
+    def get_data(self, path: str) -> bytes:
+        blob = self._blobs.get(self._path_of(path))
+        if blob is None:
+            with open(path, 'rb') as f:
+                return f.read()
+        return blob.data_stream.read()
+
+
+@contextmanager
+def imported_from_commit(repo: Repo, commit: str,
+                         package: str = 'qcodes') -> Iterator[GitImporter]:
+    """
+    Context manager within which the package is imported from the tree of the
+    commit. The package must not already be imported.
+    """
+    if package in sys.modules:
+        raise ValueError(f'{package} has already been imported in this '
+                         f'process, can not import it from commit {commit}.')
+
+    datadir = tempfile.mkdtemp(prefix=f'{package}_{commit[:8]}_')
+    importer = GitImporter(repo, commit, package, datadir)
+    sys.meta_path.insert(0, importer)
+    try:
+        yield importer
+    finally:
+        sys.meta_path.remove(importer)
+        for name in list(sys.modules):
+            if name == package or name.startswith(package + '.'):
+                del sys.modules[name]
+        shutil.rmtree(datadir, ignore_errors=True)
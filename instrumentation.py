@@ -0,0 +1,196 @@
+"""
+Instrumentation of the generating functions.
+
+With the --report option, a JSON line is appended to the report file for
+every generating function that runs, holding its version and name and
+
+ * checkout_time: time to check out (or add a worktree of, or set up the git
+   import of) its version, for the first generator run on that checkout
+ * import_time: time to import qcodes at that version, in its process
+ * wall_time and cpu_time: time to generate its fixtures, including the
+   post-processing of --fast, --build-dir and --deterministic
+ * rows: the number of rows of each table of each of its fixtures
+ * size: the size of each of its fixtures
+ * peak_rss: the peak memory use of its process so far
+
+With --profile, each generating function runs under cProfile, and the stats
+are saved as version<version>_<generator>.prof, to be looked at (or compared
+between versions) with pstats or e.g. snakeviz. With --tracemalloc, the peak
+of the memory allocated by Python while it runs and the lines that allocated
+the most are saved as version<version>_<generator>.tracemalloc.json. Memory
+allocated by SQLite itself is not traced.
+
+Run as a script, a summary table of a report is printed.
+"""
+
+import argparse
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+try:
+    import resource
+except ImportError:  # e.g. on Windows
+    resource = None
+
+import manifest
+
+
+def peak_rss() -> Optional[int]:
+    """
+    The peak resident set size of this process in bytes, if known
+    """
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+@contextmanager
+def timed() -> Iterator[Dict[str, float]]:
+    """
+    Context manager yielding a dict that gets the wall_time and cpu_time
+    spent in the context when it is left
+    """
+    timings: Dict[str, float] = {}
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield timings
+    finally:
+        timings['wall_time'] = time.perf_counter() - wall_start
+        timings['cpu_time'] = time.process_time() - cpu_start
+
+
+def profile_path(directory: str, version, generator: str,
+                 suffix: str) -> str:
+    """
+    The path of a profile of a generating function in directory
+    """
+    return os.path.join(directory, f'version{version}_{generator}{suffix}')
+
+
+@contextmanager
+def profiled(path: str) -> Iterator[None]:
+    """
+    Context manager running its contents under cProfile and saving the stats
+    to path
+    """
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        profile.dump_stats(path)
+
+
+@contextmanager
+def traced_memory(path: str, top: int = 25) -> Iterator[None]:
+    """
+    Context manager tracing the memory allocations of its contents with
+    tracemalloc, and saving the peak and the top lines that allocated the
+    memory still held at the end to path as JSON
+    """
+    tracemalloc.start()
+    try:
+        yield
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        statistics = snapshot.statistics('lineno')
+        sites = [{'site': f'{stat.traceback[0].filename}:'
+                          f'{stat.traceback[0].lineno}',
+                  'size': stat.size,
+                  'count': stat.count}
+                 for stat in statistics[:top]]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({'peak': peak, 'current': current, 'top': sites}, f,
+                      indent=2)
+
+
+def record(report: str, version, generator: str,
+           fixtures: Dict[str, str], timings: Dict[str, Any]) -> None:
+    """
+    Append the record of a generating function to a report. The fixtures
+    map the outputs of the generator to their paths.
+    """
+    line = {'version': version,
+            'generator': generator,
+            'checkout_time': timings.get('checkout_time'),
+            'import_time': timings.get('import_time'),
+            'wall_time': timings.get('wall_time'),
+            'cpu_time': timings.get('cpu_time'),
+            'rows': {output: manifest.row_counts(path)
+                     for output, path in fixtures.items()},
+            'size': {output: os.path.getsize(path)
+                     for output, path in fixtures.items()},
+            'peak_rss': peak_rss()}
+    # One write of a whole line, so that the lines of generators running in
+    # parallel processes do not get mixed up
+    with open(report, 'a') as f:
+        f.write(json.dumps(line) + '\n')
+
+
+def read(report: str) -> List[Dict[str, Any]]:
+    with open(report) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _seconds(value: Optional[float]) -> str:
+    return '' if value is None else f'{value:.2f}'
+
+
+def _megabytes(value: Optional[int]) -> str:
+    return '' if value is None else f'{value / 2**20:.1f}'
+
+
+def summary(records: Sequence[Dict[str, Any]]) -> str:
+    """
+    A table of the records of a report, the slowest generator first
+    """
+    header = ('version', 'generator', 'checkout s', 'import s', 'wall s',
+              'cpu s', 'rows', 'size MB', 'peak RSS MB')
+    rows = [header]
+    for line in sorted(records, key=lambda line: -(line['wall_time'] or 0)):
+        rows.append((str(line['version']),
+                     line['generator'],
+                     _seconds(line['checkout_time']),
+                     _seconds(line['import_time']),
+                     _seconds(line['wall_time']),
+                     _seconds(line['cpu_time']),
+                     str(sum(sum(counts.values())
+                             for counts in line['rows'].values())),
+                     _megabytes(sum(line['size'].values())),
+                     _megabytes(line['peak_rss'])))
+    total = sum(line['wall_time'] or 0 for line in records)
+    widths = [max(len(row[n]) for row in rows) for n in range(len(header))]
+    lines = ['  '.join(cell.ljust(width) if n < 2 else cell.rjust(width)
+                       for n, (cell, width) in enumerate(zip(row, widths)))
+             for row in rows]
+    lines.insert(1, '-' * len(lines[0]))
+    lines.append(f'{len(records)} generators, {total:.2f} s in total')
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Print a summary table of a report of the generators')
+    parser.add_argument('report')
+    args = parser.parse_args(argv)
+    print(summary(read(args.report)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,187 @@
+"""
+Manifests of the generated fixtures, and verification against them.
+
+Every versionN fixture folder gets a manifest.json recording, for each
+.db-file generated into it, the SHA-256 hash and size of the file, the QCoDeS
+commit and the hash of the source of the generating function that made it,
+the SHA-256 hash of each fixture it was made from (its inputs) and the number
+of rows of each of its tables.
+
+Verifying a fixture checks that it is there, has the recorded size and hash,
+and was made at the commit and with the generator source of today, from the
+inputs of today. The files
+are hashed through mmap on a thread pool, hashlib releasing the GIL while it
+hashes, so that checking all fixtures takes well under a second.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import (Any, Callable, Dict, Iterator, Mapping, Optional, Sequence,
+                    Tuple)
+
+import fixture_cache
+
+MANIFEST_NAME = 'manifest.json'
+
+# How long to wait for another process to finish updating a manifest
+LOCK_TIMEOUT = 60
+
+
+def manifest_path(fixture: str) -> str:
+    """
+    The path of the manifest that records the fixture at the path supplied
+    """
+    return os.path.join(os.path.dirname(fixture), MANIFEST_NAME)
+
+
+def read(path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Read the entries of a manifest, by file name. A missing manifest has no
+    entries.
+    """
+    if not os.path.isfile(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)['fixtures']
+
+
+@contextmanager
+def _locked(path: str) -> Iterator[None]:
+    """
+    Context manager holding a lock file next to path, for the generators of
+    a version that run in parallel processes
+    """
+    lock = f'{path}.lock'
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while True:
+        try:
+            os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f'{lock} is held for over {LOCK_TIMEOUT} '
+                                   's, remove it if no generator is running')
+            time.sleep(0.01)
+    try:
+        yield
+    finally:
+        os.remove(lock)
+
+
+def row_counts(path: str) -> Dict[str, int]:
+    """
+    The number of rows of each table of a .db-file
+    """
+    conn = sqlite3.connect(path)
+    try:
+        tables = [name for name, in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' "
+            "ORDER BY name")]
+        return {table: conn.execute(f'SELECT COUNT(*) FROM "{table}"'
+                                    ).fetchone()[0]
+                for table in tables}
+    finally:
+        conn.close()
+
+
+def _input_path(fixture: str, input_: str) -> str:
+    """
+    The path of an input, given relative to the fixture folder like
+    'version2/some_runs.db', of a fixture in that folder
+    """
+    fixture_folder = os.path.dirname(os.path.dirname(fixture))
+    return os.path.join(fixture_folder, *input_.split('/'))
+
+
+def record(fixture: str, git_hash: str, generator: Callable,
+           inputs: Optional[Mapping[str, str]] = None) -> None:
+    """
+    Record a freshly generated (or restored) fixture in its manifest, along
+    with the hashes of the inputs it was made from, by input
+    """
+    entry = {'sha256': fixture_cache.file_hash(fixture),
+             'size': os.path.getsize(fixture),
+             'git_hash': git_hash,
+             'generator': generator.__name__,
+             'source_hash': fixture_cache.source_hash(generator),
+             'inputs': dict(sorted((inputs or {}).items())),
+             'row_counts': row_counts(fixture)}
+
+    path = manifest_path(fixture)
+    with _locked(path):
+        entries = read(path)
+        entries[os.path.basename(fixture)] = entry
+        partial = f'{path}.partial'
+        with open(partial, 'w') as f:
+            json.dump({'fixtures': dict(sorted(entries.items()))}, f,
+                      indent=2)
+        os.replace(partial, path)
+
+
+def mmap_hash(path: str) -> str:
+    """
+    Hash the contents of a file like fixture_cache.file_hash, but in one go
+    through mmap
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return hashlib.sha256().hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return hashlib.sha256(mapped).hexdigest()
+
+
+def check(fixture: str, git_hash: str, generator: Callable,
+          entries: Dict[str, Dict[str, Any]]) -> Optional[str]:
+    """
+    Check a fixture against its entry in the manifest entries and return
+    what is wrong with it, if anything
+    """
+    entry = entries.get(os.path.basename(fixture))
+    if entry is None:
+        return 'not in the manifest'
+    if not os.path.isfile(fixture):
+        return 'missing'
+    if entry['git_hash'] != git_hash:
+        return f"generated at {entry['git_hash']}, not {git_hash}"
+    if entry['source_hash'] != fixture_cache.source_hash(generator):
+        return f'{generator.__name__} changed since it generated this'
+    if os.path.getsize(fixture) != entry['size']:
+        return (f'{os.path.getsize(fixture)} bytes instead of '
+                f"{entry['size']}")
+    if mmap_hash(fixture) != entry['sha256']:
+        return 'contents changed'
+    recorded = entry.get('inputs', {})
+    for input_ in getattr(generator, 'inputs', ()):
+        if input_ not in recorded:
+            return f'made without a record of its input {input_}'
+        path = _input_path(fixture, input_)
+        if not os.path.isfile(path) or mmap_hash(path) != recorded[input_]:
+            return f'made from another {input_} than there is now'
+    return None
+
+
+def verify(fixtures: Sequence[Tuple[str, str, Callable]],
+           jobs: Optional[int] = None) -> Dict[str, str]:
+    """
+    Check the fixtures, given as (path, git hash, generating function), on
+    jobs threads and return what is wrong with those that fail, by path
+    """
+    manifests: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for fixture, _, _ in fixtures:
+        path = manifest_path(fixture)
+        if path not in manifests:
+            manifests[path] = read(path)
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        problems = executor.map(
+            lambda item: check(*item, manifests[manifest_path(item[0])]),
+            fixtures)
+        return {fixture: problem
+                for (fixture, _, _), problem in zip(fixtures, problems)
+                if problem is not None}
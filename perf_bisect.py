@@ -0,0 +1,215 @@
+"""
+Find the QCoDeS commit that made something slower.
+
+Given a good and a bad commit of QCoDeS and a benchmark, the commits in
+between (along the first-parent line, so merges of pull requests) are
+bisected: each commit that is visited is checked out, with the repository
+left untouched afterwards like by the generating scripts, and the benchmark is
+run on it in fresh processes. A commit is bad if its median time exceeds that
+of the good commit by more than the threshold.
+
+The benchmark is given as module:function and is written like a generating
+function: it takes no arguments and does its QCoDeS imports inside. Its wall
+time is measured, or, if it returns a number, that is taken as its time in
+seconds, e.g. to leave out its setup. In each process, it is run once to warm
+up before it is measured. Measurements of a commit are repeated until the
+confidence interval of its median lies wholly on one side of the threshold,
+or until --max-repeat, so that noise does not send the bisection astray.
+
+    python perf_bisect.py <good> <bad> benchmark_writes:standard_measurement
+"""
+
+import argparse
+import importlib
+import math
+import statistics
+import sys
+import time
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+# NB: it's important that we do not import anything from qcodes in this
+# process, every commit is imported in processes of its own
+import utils as utils
+import scheduler
+
+
+class Verdict(NamedTuple):
+    """
+    The measurements of a commit: its median time, the confidence interval
+    of the median, whether it is slower than the threshold and whether the
+    interval was clear of the threshold
+    """
+    median: float
+    low: float
+    high: float
+    bad: bool
+    conclusive: bool
+
+
+def measure(benchmark: str, checkout: str, repeat: int) -> List[float]:
+    """
+    Run the benchmark once to warm up and then repeat times with QCoDeS
+    imported from the checkout, and return its times. Meant to be run in a
+    fresh process.
+    """
+    utils.check_qcodes_location(checkout)
+    module, _, name = benchmark.partition(':')
+    function = getattr(importlib.import_module(module), name)
+
+    function()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        times.append(float(result) if isinstance(result, (int, float))
+                     else elapsed)
+    return times
+
+
+def median_interval(times: Sequence[float],
+                    confidence: float = 0.95) -> Tuple[float, float]:
+    """
+    A confidence interval of the median of the distribution that the times
+    are drawn from, from their order statistics, without assuming anything
+    about that distribution. Too few times give the whole range.
+    """
+    ordered = sorted(times)
+    n = len(ordered)
+    # the largest k such that the median lies below the k-th smallest time
+    # with a probability of at most (1 - confidence)/2
+    k = 0
+    tail = 0.0
+    while k < n // 2:
+        tail += math.comb(n, k) / 2**n
+        if tail > (1 - confidence) / 2:
+            break
+        k += 1
+    k = max(k, 1)
+    return ordered[k - 1], ordered[n - k]
+
+
+def _run(benchmark: str, commit: str, repeat: int) -> List[float]:
+    """
+    Check out the commit and measure the benchmark on it in a fresh process
+    """
+    utils.git_repo().git.checkout(commit)
+    with scheduler.pool_context().Pool(processes=1,
+                                       maxtasksperchild=1) as pool:
+        return pool.apply(measure, (benchmark, utils.git_repo_path(),
+                                    repeat))
+
+
+def judge(benchmark: str, commit: str, limit: Optional[float], repeat: int,
+          max_repeat: int, confidence: float) -> Verdict:
+    """
+    Measure a commit, repeat times at a time, until the confidence interval
+    of its median lies wholly on one side of the limit or max_repeat times
+    were taken. Without a limit, repeat times are taken.
+    """
+    times: List[float] = []
+    while True:
+        times.extend(_run(benchmark, commit, repeat))
+        low, high = median_interval(times, confidence)
+        median = statistics.median(times)
+        if limit is None:
+            return Verdict(median, low, high, False, True)
+        if low > limit or high <= limit:
+            return Verdict(median, low, high, low > limit, True)
+        if len(times) >= max_repeat:
+            return Verdict(median, low, high, median > limit, False)
+
+
+def _describe(commit: str, verdict: Verdict) -> str:
+    state = 'bad' if verdict.bad else 'good'
+    if not verdict.conclusive:
+        state += ' (inconclusive)'
+    return (f'{commit[:10]} median {verdict.median:.4f} s '
+            f'[{verdict.low:.4f}, {verdict.high:.4f}] {state}')
+
+
+def bisect(good: str, bad: str, benchmark: str, threshold: float,
+           repeat: int = 7, max_repeat: int = 35,
+           confidence: float = 0.95) -> Optional[str]:
+    """
+    Find the first commit after good, up to bad, whose median time of the
+    benchmark exceeds that of good by more than threshold (a fraction).
+    Returns None if bad is not slower than that. The repository is left as
+    it was found.
+    """
+    repo = utils.git_repo()
+    good = repo.commit(good).hexsha
+    bad = repo.commit(bad).hexsha
+    commits = repo.git.rev_list('--first-parent', '--ancestry-path',
+                                '--reverse', f'{good}..{bad}').split()
+    if not commits or commits[-1] != bad:
+        raise ValueError(f'{bad} does not descend from {good} along the '
+                         'first-parent line')
+
+    with utils.leave_untouched(repo):
+        baseline = judge(benchmark, good, None, max_repeat, max_repeat,
+                         confidence)
+        limit = baseline.median * (1 + threshold)
+        print(f'{_describe(good, baseline)}, threshold {limit:.4f} s')
+
+        verdict = judge(benchmark, bad, limit, repeat, max_repeat,
+                        confidence)
+        print(_describe(bad, verdict))
+        if not verdict.bad:
+            return None
+
+        # commits[lo] is the last known good one (-1 for good itself) and
+        # commits[hi] the first known bad one
+        lo, hi = -1, len(commits) - 1
+        while hi - lo > 1:
+            middle = (lo + hi) // 2
+            verdict = judge(benchmark, commits[middle], limit, repeat,
+                            max_repeat, confidence)
+            print(f'{_describe(commits[middle], verdict)}, '
+                  f'{hi - lo - 1} commits left')
+            if verdict.bad:
+                hi = middle
+            else:
+                lo = middle
+        return commits[hi]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Find the QCoDeS commit that made a benchmark slower')
+    parser.add_argument('good', help='a commit that is fast')
+    parser.add_argument('bad', help='a later commit that is slow')
+    parser.add_argument('benchmark',
+                        help='the benchmark as module:function, taking no '
+                             'arguments')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='fraction by which a commit must be slower than '
+                             'the good one to be bad (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=7,
+                        help='number of times to measure a commit at a time '
+                             '(default: %(default)s)')
+    parser.add_argument('--max-repeat', type=int, default=35,
+                        help='number of times to measure a commit at most, '
+                             'and the good one always (default: %(default)s)')
+    parser.add_argument('--confidence', type=float, default=0.95,
+                        help='confidence level of the intervals of the '
+                             'medians (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    if ':' not in args.benchmark:
+        parser.error('The benchmark must be given as module:function')
+
+    first = bisect(args.good, args.bad, args.benchmark, args.threshold,
+                   args.repeat, args.max_repeat, args.confidence)
+    if first is None:
+        print(f'{args.bad} is not slower than {args.good} by more than '
+              f'{args.threshold:.0%}')
+        return 1
+
+    commit = utils.git_repo().commit(first)
+    print(f'First slow commit: {commit.hexsha} {commit.summary}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
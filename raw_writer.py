@@ -0,0 +1,317 @@
+"""
+Writing the runs of a .db-file straight into its tables with SQL.
+
+Going through Measurement and the datasaver of an old QCoDeS is by far the
+slowest part of generating large .db-files. The raw writer instead starts
+from a small reference .db-file made with the QCoDeS API of the version,
+holding a single run of the right parameters, and clones that run as many
+times as needed with executemany, all in one transaction. The schema of the
+version and the formats of the layouts, dependencies, run_description and
+snapshot of the reference run are thereby reproduced exactly, while the run
+ids, counters, result tables, timestamps and GUIDs are made the way QCoDeS
+makes them. The runs may be spread over many experiments, copies of the
+experiment of the reference run.
+
+Note that QCoDeS makes a result table per run, and SQLite scans its whole
+schema for every CREATE TABLE, so the time to make the tables grows with the
+square of the number of runs, whichever way they are written.
+
+Run as a script, it compares two .db-files, e.g. one written by the raw
+writer and one by the QCoDeS API, and lists how they differ.
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from typing import Any, Callable, Dict, Iterator, List, Sequence
+
+import bulk_data
+import db_tools
+
+# Columns that differ between any two generations of the same .db-file
+VOLATILE_COLUMNS = {'runs': {'run_timestamp', 'completed_timestamp', 'guid'},
+                    'experiments': {'start_time', 'end_time'}}
+
+# Tables of SQLite itself that may or may not be there
+_INTERNAL_TABLES = {'sqlite_stat1', 'sqlite_stat4'}
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+
+
+def _insert(conn: sqlite3.Connection, table: str, columns: Sequence[str],
+            rows: List[tuple]) -> None:
+    if not rows:
+        return
+    quoted = ','.join(f'"{column}"' for column in columns)
+    placeholders = ','.join('?' * len(columns))
+    conn.executemany(f'INSERT INTO "{table}" ({quoted}) '
+                     f'VALUES ({placeholders})', rows)
+    rows.clear()
+
+
+def make_guid(template: str, timeint: int) -> str:
+    """
+    A GUID with the sample, location and work station of the template GUID,
+    for the time timeint (in ms), formatted like generate_guid of QCoDeS
+    """
+    time_str = f'{timeint:016x}'
+    return f'{template[:19]}{time_str[:4]}-{time_str[4:]}'
+
+
+def runs_per_experiment(runs: int, experiments: int) -> List[int]:
+    """
+    The number of runs in each experiment when the runs are spread as evenly
+    as possible over the experiments, in order
+    """
+    if not 1 <= experiments <= runs:
+        raise ValueError(f'Can not spread {runs} runs over {experiments} '
+                         'experiments')
+    firsts = [-(-n * runs // experiments) for n in range(experiments + 1)]
+    return [last - first for first, last in zip(firsts, firsts[1:])]
+
+
+def _experiment_name(name: str, exp_id: int) -> str:
+    """
+    The name of a copy of the experiment of the given name, e.g.
+    experiment_2 for experiment_1
+    """
+    stem, _, number = name.rpartition('_')
+    if stem and number.isdigit():
+        return f'{stem}_{exp_id}'
+    return f'{name}_{exp_id}'
+
+
+def clone_runs(reference: str, target: str, runs: int,
+               run_data: Callable[[], Iterator[Dict[str, Any]]],
+               chunk_size: int = bulk_data.DEFAULT_CHUNK_SIZE,
+               experiments: int = 1) -> None:
+    """
+    Write a copy of the reference .db-file, which must hold exactly one run,
+    to target, with that run cloned into the given number of runs. The data
+    of each run, in order, comes from calling run_data, which yields chunks
+    of the result table as dicts mapping columns to arrays (or scalars used
+    for all rows of the chunk).
+
+    The runs are spread over the given number of experiments (see
+    runs_per_experiment), the first being that of the reference run and the
+    others copies of it, named after their exp_id.
+
+    The target is written without journal or syncing, so it is garbage after
+    a crash.
+    """
+    if os.path.exists(target):
+        os.remove(target)
+    db_tools.copy_database(reference, target)
+
+    conn = sqlite3.connect(target, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        for pragma in db_tools.FAST_PRAGMAS:
+            conn.execute(pragma)
+        conn.execute('BEGIN')
+        _clone_runs(conn, reference, runs, run_data, chunk_size,
+                    experiments)
+        conn.execute('COMMIT')
+    finally:
+        conn.close()
+
+
+def _clone_runs(conn: sqlite3.Connection, reference: str, runs: int,
+                run_data: Callable[[], Iterator[Dict[str, Any]]],
+                chunk_size: int, experiments: int) -> None:
+    sizes = runs_per_experiment(runs, experiments)
+    found = conn.execute('SELECT COUNT(*) FROM runs').fetchone()[0]
+    if found != 1:
+        raise ValueError(f'{reference} holds {found} runs, the reference '
+                         'must hold exactly one run')
+    template = dict(conn.execute('SELECT * FROM runs').fetchone())
+    exp = dict(conn.execute('SELECT * FROM experiments WHERE exp_id=?',
+                            (template['exp_id'],)).fetchone())
+
+    layouts = [dict(row) for row in conn.execute(
+        'SELECT * FROM layouts WHERE run_id=? ORDER BY layout_id',
+        (template['run_id'],))]
+    layout_ids = {layout['layout_id'] for layout in layouts}
+    dependencies = [dict(row) for row in conn.execute(
+        'SELECT * FROM dependencies ORDER BY rowid')
+        if row['dependent'] in layout_ids]
+
+    table = template['result_table_name']
+    create = conn.execute("SELECT sql FROM sqlite_master "
+                          "WHERE type='table' AND name=?",
+                          (table,)).fetchone()[0]
+    if f'"{table}"' not in create:
+        raise ValueError(f'Can not make result tables like {table!r} from '
+                         f'{create!r}')
+    data_columns = set(_columns(conn, table)) - {'id'}
+
+    # The data of the reference run is replaced as well
+    conn.execute(f'DELETE FROM "{table}"')
+
+    run_columns = list(template)
+    layout_columns = list(layouts[0]) if layouts else []
+    dependency_columns = list(dependencies[0]) if dependencies else []
+    run_rows: List[tuple] = []
+    layout_rows: List[tuple] = []
+    dependency_rows: List[tuple] = []
+    next_layout_id = conn.execute(
+        'SELECT MAX(layout_id) FROM layouts').fetchone()[0] or 0
+    start = time.time()
+
+    exp_columns = list(exp)
+    exp_rows = []
+    first = 0
+    for number, size in enumerate(sizes):
+        if number:
+            exp_id = exp['exp_id'] + number
+            copy = dict(exp, exp_id=exp_id,
+                        name=_experiment_name(exp['name'], exp_id),
+                        run_counter=exp['run_counter'] + size - 1)
+            if copy['start_time'] is not None:
+                copy['start_time'] = start + first/1000
+            exp_rows.append(tuple(copy[column] for column in exp_columns))
+        first += size
+    _insert(conn, 'experiments', exp_columns, exp_rows)
+
+    # the experiment of the run and its result_counter in there
+    number, counter = 0, template['result_counter']
+    for n in range(runs):
+        if n:
+            counter += 1
+            if counter - template['result_counter'] == sizes[number]:
+                number += 1
+                counter = template['result_counter']
+            exp_id = exp['exp_id'] + number
+            table = exp['format_string'].format(template['name'], exp_id,
+                                                counter)
+            run = dict(template,
+                       run_id=template['run_id'] + n,
+                       exp_id=exp_id,
+                       result_counter=counter,
+                       result_table_name=table)
+            # a ms apart, so that the GUIDs differ like they would in QCoDeS
+            timestamp = start + n/1000
+            for column in ('run_timestamp', 'completed_timestamp'):
+                if run[column] is not None:
+                    run[column] = timestamp
+            if run.get('guid') is not None:
+                run['guid'] = make_guid(template['guid'],
+                                        int(round(timestamp*1000)))
+            if 'captured_run_id' in run:
+                run['captured_run_id'] = run['run_id']
+            if 'captured_counter' in run:
+                run['captured_counter'] = counter
+            run_rows.append(tuple(run[column] for column in run_columns))
+
+            new_ids = {}
+            for layout in layouts:
+                next_layout_id += 1
+                new_ids[layout['layout_id']] = next_layout_id
+                layout_rows.append(tuple(
+                    dict(layout, layout_id=next_layout_id,
+                         run_id=run['run_id'])[column]
+                    for column in layout_columns))
+            for dependency in dependencies:
+                dependency_rows.append(tuple(
+                    dict(dependency,
+                         dependent=new_ids[dependency['dependent']],
+                         independent=new_ids[dependency['independent']]
+                         )[column]
+                    for column in dependency_columns))
+
+            conn.execute(create.replace(f'"{template["result_table_name"]}"',
+                                        f'"{table}"', 1))
+
+        for chunk in run_data():
+            unknown = set(chunk) - data_columns
+            if unknown:
+                raise ValueError(f'{sorted(unknown)} are not columns of '
+                                 f'{table}')
+            for rows in bulk_data.iter_rows(*chunk.values(),
+                                            chunk_size=chunk_size):
+                _insert(conn, table, list(chunk), rows)
+
+        if len(run_rows) >= chunk_size or n == runs - 1:
+            _insert(conn, 'runs', run_columns, run_rows)
+            _insert(conn, 'layouts', layout_columns, layout_rows)
+            _insert(conn, 'dependencies', dependency_columns,
+                    dependency_rows)
+
+    conn.execute('UPDATE experiments SET run_counter=? WHERE exp_id=?',
+                 (exp['run_counter'] + sizes[0] - 1, exp['exp_id']))
+
+
+def _tables(conn: sqlite3.Connection) -> List[str]:
+    return [name for name, in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")
+        if name not in _INTERNAL_TABLES]
+
+
+def differences(first: str, second: str) -> List[str]:
+    """
+    How two .db-files differ, apart from VOLATILE_COLUMNS: their
+    user_version, schema and the rows of each table, in order
+    """
+    conns = [sqlite3.connect(path) for path in (first, second)]
+    try:
+        found = []
+        versions = [conn.execute('PRAGMA user_version').fetchone()[0]
+                    for conn in conns]
+        if versions[0] != versions[1]:
+            found.append(f'user_version {versions[0]} != {versions[1]}')
+
+        schemas = [set(conn.execute(
+            'SELECT type, name, sql FROM sqlite_master WHERE name NOT IN '
+            f'({",".join("?" * len(_INTERNAL_TABLES))})',
+            tuple(_INTERNAL_TABLES))) for conn in conns]
+        for type_, name, _ in sorted(schemas[0] ^ schemas[1],
+                                     key=lambda item: item[1]):
+            found.append(f'schema of {type_} {name} differs')
+
+        for table in sorted(set(_tables(conns[0])) & set(_tables(conns[1]))):
+            volatile = VOLATILE_COLUMNS.get(table, set())
+            columns = [column for column in _columns(conns[0], table)
+                       if column not in volatile]
+            if columns != [column for column in _columns(conns[1], table)
+                           if column not in volatile]:
+                continue  # already reported as a schema difference
+            quoted = ','.join(f'"{column}"' for column in columns)
+            rows = [conn.execute(f'SELECT {quoted} FROM "{table}" '
+                                 'ORDER BY rowid').fetchall()
+                    for conn in conns]
+            if len(rows[0]) != len(rows[1]):
+                found.append(f'{table} has {len(rows[0])} != {len(rows[1])} '
+                             'rows')
+            else:
+                for n, (row0, row1) in enumerate(zip(*rows)):
+                    if row0 != row1:
+                        found.append(f'row {n} of {table} differs: {row0} != '
+                                     f'{row1}')
+                        break
+        return found
+    finally:
+        for conn in conns:
+            conn.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Compare two .db-files, apart from timestamps and GUIDs')
+    parser.add_argument('first')
+    parser.add_argument('second')
+    args = parser.parse_args(argv)
+
+    found = differences(args.first, args.second)
+    for difference in found:
+        print(difference)
+    if not found:
+        print(f'{args.first} and {args.second} are equivalent')
+    return 1 if found else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
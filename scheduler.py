@@ -0,0 +1,337 @@
+"""
+Schedule the generating functions of all versions as a dependency graph.
+
+Every generating function in the GENERATORS of the generate_version_*.py
+scripts is a node of the graph, and a node depends on the nodes writing the
+files it declares as inputs (see utils.generates). Nodes whose dependencies are
+done run concurrently, each in a fresh process importing QCoDeS from a
+worktree of its version (or from the git objects).
+
+Since the hashes of the inputs of a generator are part of its key in the
+fixture cache, only the nodes downstream of a fixture that changed are run
+again, and all other fixtures are restored from the cache.
+
+Where the platform has it, the processes are forked from a fork server that
+has imported the modules that every generator needs, whatever its version
+(PRELOAD), so that a process starts in milliseconds and only has to import
+the qcodes of its version.
+"""
+
+import glob
+import importlib
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from contextlib import ExitStack
+from typing import (Dict, Iterable, List, NamedTuple, Optional, Set, Tuple,
+                    Union)
+
+# NB: it's important that we do not import anything from qcodes in this
+# process, the generators import qcodes in the processes of the pool
+import utils as utils
+import fixture_cache
+import instrumentation
+
+
+# The modules imported once in the fork server, none of which may import
+# qcodes. utils and GitPython import lazily, so they are preloaded explicitly.
+PRELOAD = ['numpy', 'git', 'sqlite3', 'utils']
+
+# The modules of the generating functions besides the generate_version_*.py
+# scripts, which are reloaded in watch mode
+GENERATOR_MODULES = ('bulk_data', 'raw_writer', 'fixture_spec')
+
+
+class Node(NamedTuple):
+    """
+    A generating function: its version, the name of its module and its own
+    name, along with the files it reads and writes
+    """
+    version: Union[int, str]
+    module: str
+    generator: str
+    inputs: Tuple[str, ...]
+    outputs: Tuple[str, ...]
+
+
+def version_of_module(module: str) -> Union[int, str]:
+    """
+    The version of a generate_version_<version> module
+    """
+    version = module[len('generate_version_'):]
+    return int(version) if version.isdigit() else version
+
+
+def discover(versions: Optional[Iterable[Union[int, str]]] = None
+             ) -> List[Node]:
+    """
+    Find the generating functions of the supplied versions (default: all) in
+    the generate_version_*.py scripts next to this module
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    wanted = None if versions is None else set(versions)
+
+    nodes = []
+    for path in sorted(glob.glob(os.path.join(here, 'generate_version_*.py'))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        version = version_of_module(name)
+        if wanted is not None and version not in wanted:
+            continue
+        module = importlib.import_module(name)
+        nodes.extend(nodes_of(version,
+                              utils.select_generators(module.GENERATORS)))
+    return nodes
+
+
+def nodes_of(version: Union[int, str], gens: Iterable) -> List[Node]:
+    """
+    The nodes of the generating functions of a version
+    """
+    nodes = []
+    for generator in gens:
+        module = generator.__module__
+        if module == '__main__':
+            # a generate_version_*.py script that is run, whose processes
+            # import it by its name
+            module = f'generate_version_{version}'
+        nodes.append(Node(version, module, generator.__name__,
+                          tuple(getattr(generator, 'inputs', ())),
+                          utils.outputs_of(generator)))
+    return nodes
+
+
+def dependencies(nodes: Iterable[Node]) -> Dict[Node, Set[Node]]:
+    """
+    Map each node to the nodes writing its inputs. Inputs not written by any
+    of the nodes must already exist when the node runs.
+    """
+    producers: Dict[str, Node] = {}
+    for node in nodes:
+        for output in node.outputs:
+            if output in producers:
+                raise ValueError(f'{output} is written by both '
+                                 f'{producers[output].generator} of version '
+                                 f'{producers[output].version} and '
+                                 f'{node.generator} of version {node.version}')
+            producers[output] = node
+
+    return {node: {producers[input_] for input_ in node.inputs
+                   if input_ in producers}
+            for node in nodes}
+
+
+def topological_order(deps: Dict[Node, Set[Node]]) -> List[Node]:
+    """
+    Order the nodes such that every node comes after its dependencies
+    """
+    remaining = {node: set(node_deps) for node, node_deps in deps.items()}
+    order: List[Node] = []
+    while remaining:
+        ready = [node for node, node_deps in remaining.items()
+                 if not node_deps]
+        if not ready:
+            raise ValueError('The inputs and outputs of the generators form a '
+                             'cycle: '
+                             f'{[node.generator for node in remaining]}')
+        for node in ready:
+            order.append(node)
+            del remaining[node]
+        for node_deps in remaining.values():
+            node_deps.difference_update(ready)
+    return order
+
+
+def plan(nodes: List[Node]) -> Dict[Node, str]:
+    """
+    What run would do with each node, in the order it would get to them:
+    'restore' its fixtures from the cache, or 'run' its generating function.
+    A node runs if a node writing its inputs runs. Neither git nor qcodes is
+    touched.
+    """
+    deps = dependencies(nodes)
+    actions: Dict[Node, str] = {}
+    for node in topological_order(deps):
+        cached = (all(actions[dep] == 'restore' for dep in deps[node])
+                  and all(os.path.isfile(utils.output_path(input_))
+                          for input_ in node.inputs)
+                  and fixture_cache.contains(
+                      utils.fixture_key(node.version, generator_of(node)),
+                      node.outputs))
+        actions[node] = 'restore' if cached else 'run'
+    return actions
+
+
+def generator_of(node: Node):
+    module = importlib.import_module(node.module)
+    return getattr(module, node.generator)
+
+
+def run_node(node: Node, worktree: Optional[str],
+             checkout_time: Optional[float] = None) -> None:
+    """
+    Run the generating function of a node with QCoDeS imported from the
+    worktree (or checkout) of its version, or from the git objects if there
+    is none. Meant to be run in a fresh process.
+    """
+    gens = (generator_of(node),)
+    if worktree is None:
+        utils.run_generators_from_git_objects(node.version, gens)
+    else:
+        utils.run_generators_in_worktree(node.version, gens, worktree,
+                                         checkout_time)
+
+
+def _reporter(finished: queue.Queue, node: Node, success: bool):
+    """
+    Make a pool callback that puts the outcome of a node on the queue
+    """
+    def report(result):
+        if not success:
+            print(f'{node.generator} of version {node.version} failed: '
+                  f'{result!r}')
+        finished.put((node, success))
+    return report
+
+
+def pool_context():
+    """
+    The multiprocessing context of the processes running generators: a fork
+    server with PRELOAD imported where the platform has one, or else spawn.
+    Either way, no process inherits an imported qcodes.
+    """
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(PRELOAD)
+    return context
+
+
+def _mtimes(directory: str) -> Dict[str, float]:
+    return {path: os.stat(path).st_mtime
+            for path in glob.glob(os.path.join(directory, '*.py'))}
+
+
+def wait_for_changes(interval: float = 1.0) -> List[str]:
+    """
+    Wait until a module next to this one changes and return the names of the
+    modules that changed
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    before = _mtimes(here)
+    while True:
+        time.sleep(interval)
+        after = _mtimes(here)
+        if after != before:
+            changed = {path for path in set(before) | set(after)
+                       if before.get(path) != after.get(path)}
+            return sorted(os.path.splitext(os.path.basename(path))[0]
+                          for path in changed)
+
+
+def reload_generators() -> None:
+    """
+    Reload the modules of the generating functions that have been imported,
+    so that discover and the fixture cache see their current source. The
+    processes running generators import them afresh anyway.
+    """
+    for name in GENERATOR_MODULES:
+        if name in sys.modules:
+            importlib.reload(sys.modules[name])
+    for name in sorted(sys.modules):
+        if name.startswith('generate_version_'):
+            importlib.reload(sys.modules[name])
+
+
+def not_reloadable(changed: Iterable[str]) -> List[str]:
+    """
+    Of the modules that changed, those that reload_generators does not
+    reload. The fork server has imported e.g. utils and db_tools with
+    PRELOAD, so the processes forked from it would run their old source while
+    the fixture cache keys the fixtures with the new one.
+    """
+    return sorted(name for name in changed
+                  if name not in GENERATOR_MODULES
+                  and not name.startswith('generate_version_'))
+
+
+def run(nodes: List[Node], jobs: int, worktree_dir: Optional[str] = None,
+        checkout: Optional[str] = None) -> List[Node]:
+    """
+    Run the nodes on a process pool of size jobs, every node after its
+    dependencies. Nodes whose fixtures are in the cache are restored in this
+    process instead. The pool is only started, and worktrees of a version
+    only added (in worktree_dir), once a node (of that version) needs to run,
+    unless QCoDeS is imported from the git objects or all nodes are of the
+    version that the QCoDeS repo at checkout is checked out at. Returns the
+    nodes that failed.
+    """
+    deps = dependencies(nodes)
+    pending = topological_order(deps)
+
+    finished: 'queue.Queue[Tuple[Node, bool]]' = queue.Queue()
+
+    worktrees: Dict[Union[int, str], str] = {}
+    done: Set[Node] = set()
+    failed: List[Node] = []
+    running = 0
+
+    try:
+        with ExitStack() as stack:
+            pool = None
+            while pending or running:
+                for node in list(pending):
+                    if deps[node] & set(failed):
+                        print(f'Skipping {node.generator} of version '
+                              f'{node.version}, a generator it depends on '
+                              'failed')
+                        pending.remove(node)
+                        failed.append(node)
+                        continue
+                    if not deps[node] <= done:
+                        continue
+
+                    pending.remove(node)
+                    gens = (generator_of(node),)
+                    if not utils.restore_cached_fixtures(node.version, gens):
+                        print(f'Restored {node.generator} of version '
+                              f'{node.version} from the cache')
+                        done.add(node)
+                        continue
+
+                    checkout_time = None
+                    if checkout is not None:
+                        path = checkout
+                    elif utils.from_git_objects():
+                        path = None
+                    else:
+                        if node.version not in worktrees:
+                            with instrumentation.timed() as added:
+                                worktrees[node.version] = utils.add_worktree(
+                                    node.version, worktree_dir)
+                            checkout_time = added['wall_time']
+                        path = worktrees[node.version]
+                    if pool is None:
+                        pool = stack.enter_context(pool_context().Pool(
+                            processes=jobs, maxtasksperchild=1))
+                    running += 1
+                    pool.apply_async(
+                        run_node, (node, path, checkout_time),
+                        callback=_reporter(finished, node, True),
+                        error_callback=_reporter(finished, node, False))
+
+                if running:
+                    node, success = finished.get()
+                    running -= 1
+                    if success:
+                        done.add(node)
+                    else:
+                        failed.append(node)
+    finally:
+        for worktree in worktrees.values():
+            utils.remove_worktree(worktree)
+        if worktrees:
+            utils.git_repo().git.worktree('prune')
+
+    return failed
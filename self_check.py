@@ -0,0 +1,182 @@
+"""
+Check the pure functions that the contents of the fixtures depend on.
+
+The fixtures are only as good as the helpers that draw and write their data,
+and a change to one of those would silently change every fixture made with
+it. So this checks, without git or QCoDeS, that
+
+ * bulk_data draws the same values, in the same order, as the nested loop of
+   np.random.rand calls that the generators used to make, in any chunks, and
+   that its grids have the requested number of points
+ * raw_writer spreads runs evenly over experiments
+ * utils parses --scale like the README says
+ * a .db-file replayed from its sql_dump dumps the same again
+ * perf_bisect's confidence interval of the median is the textbook one
+
+Run it after changing any of these:
+
+    python self_check.py
+"""
+
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import traceback
+from typing import Callable, List
+
+import bulk_data
+import perf_bisect
+import raw_writer
+import sql_dump
+import utils as utils
+
+
+def check_iter_grid_values() -> None:
+    import numpy as np
+
+    for nx, ny, chunk_size in [(1, 1, 1), (3, 5, 1), (10, 10, 7),
+                               (7, 3, 100), (4, 4, 16), (5, 20, 10)]:
+        np.random.seed(0)
+        expected = []
+        for x in np.random.rand(nx):
+            for y in np.random.rand(ny):
+                z = np.random.rand()
+                expected.append((x, y, z))
+
+        np.random.seed(0)
+        chunks = list(bulk_data.iter_grid_values(nx, ny,
+                                                 chunk_size=chunk_size))
+        for chunk in chunks:
+            assert len(chunk[0]) <= max(chunk_size, ny), \
+                f'A chunk of {len(chunk[0])} rows for chunk_size {chunk_size}'
+        drawn = [tuple(row) for chunk in chunks for row in zip(*chunk)]
+        assert drawn == expected, \
+            f'iter_grid_values({nx}, {ny}, chunk_size={chunk_size}) does ' \
+            'not draw the values of the nested loop'
+
+        np.random.seed(0)
+        assert [tuple(row) for row in zip(*bulk_data.grid_values(nx, ny))] \
+            == expected, f'grid_values({nx}, {ny}) differs from the loop'
+
+
+def check_grid_shape() -> None:
+    assert bulk_data.grid_shape(100) == (10, 10)
+    assert bulk_data.grid_shape(int(1e5)) == (250, 400)
+    for points in range(1, 2000):
+        nx, ny = bulk_data.grid_shape(points)
+        assert nx * ny == points and nx <= ny, \
+            f'grid_shape({points}) is {nx}x{ny}'
+
+
+def check_runs_per_experiment() -> None:
+    assert raw_writer.runs_per_experiment(10, 3) == [4, 3, 3]
+    assert raw_writer.runs_per_experiment(10000, 100) == [100] * 100
+    for runs in range(1, 50):
+        for experiments in range(1, runs + 1):
+            spread = raw_writer.runs_per_experiment(runs, experiments)
+            assert len(spread) == experiments and sum(spread) == runs
+            assert max(spread) - min(spread) <= 1, \
+                f'{runs} runs spread over {experiments} as {spread}'
+    for runs, experiments in [(1, 0), (3, 4)]:
+        try:
+            raw_writer.runs_per_experiment(runs, experiments)
+        except ValueError:
+            continue
+        raise AssertionError(f'{runs} runs spread over {experiments} '
+                             'experiments')
+
+
+def check_parse_scale() -> None:
+    assert utils.parse_scale('runs=10000,points=1e5,params=50') == \
+        {'runs': 10000, 'points': 100000, 'params': 50}
+    assert utils.parse_scale(' points = 16 ') == {'points': 16}
+    for scale in ['runs', 'runs=', 'size=1', 'runs=1,,points=2']:
+        try:
+            utils.parse_scale(scale)
+        except ValueError:
+            continue
+        raise AssertionError(f'{scale!r} parsed as a scale')
+
+
+def check_sql_dump_round_trip() -> None:
+    folder = tempfile.mkdtemp(prefix='qcodes_self_check_')
+    try:
+        path = os.path.join(folder, 'original.db')
+        conn = sqlite3.connect(path)
+        with conn:
+            conn.execute('PRAGMA user_version=3')
+            conn.execute('CREATE TABLE runs (run_id INTEGER PRIMARY KEY '
+                         'AUTOINCREMENT, name TEXT, "odd ""name""" REAL, '
+                         'data BLOB)')
+            conn.execute('CREATE INDEX IF NOT EXISTS runs_name ON runs(name)')
+            conn.executemany(
+                'INSERT INTO runs (name, "odd ""name""", data) '
+                'VALUES (?, ?, ?)',
+                [("it's", 0.1, b'\x00\xff'), (None, float('inf'), None),
+                 ('ünïcode', -float('inf'), b''), ('', 1e-300, None)]
+                + [(f'run {n}', random.Random(n).random(), bytes([n]))
+                   for n in range(2 * sql_dump.ROWS_PER_INSERT)])
+            conn.execute('DELETE FROM runs WHERE run_id=2')
+        conn.close()
+
+        dumped = os.path.join(folder, 'original.sql.xz')
+        sql_dump.dump(path, dumped)
+        replayed = os.path.join(folder, 'replayed.db')
+        sql_dump.replay(dumped, replayed)
+
+        statements = []
+        for db in (path, replayed):
+            conn = sqlite3.connect(db)
+            try:
+                statements.append(list(sql_dump.iter_dump(conn)))
+            finally:
+                conn.close()
+        assert statements[0] == statements[1], \
+            'A replayed .db-file does not dump the same as the original'
+
+        again = os.path.join(folder, 'again.db')
+        sql_dump.replay(dumped, again)
+        with open(replayed, 'rb') as first, open(again, 'rb') as second:
+            assert first.read() == second.read(), \
+                'Replaying a dump twice gives different files'
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def check_median_interval() -> None:
+    # The order statistics of the 95% interval of the median of n samples
+    # from the tables of e.g. Conover, Practical Nonparametric Statistics
+    for n, (low, high) in {6: (1, 6), 10: (2, 9), 20: (6, 15),
+                           50: (18, 33)}.items():
+        times = [float(t) for t in range(1, n + 1)]
+        random.Random(n).shuffle(times)
+        assert perf_bisect.median_interval(times) == (low, high), \
+            f'median_interval of {n} times is ' \
+            f'{perf_bisect.median_interval(times)}, not {(low, high)}'
+    assert perf_bisect.median_interval([3.0, 1.0, 2.0]) == (1.0, 3.0)
+
+
+CHECKS: List[Callable[[], None]] = [
+    check_iter_grid_values, check_grid_shape, check_runs_per_experiment,
+    check_parse_scale, check_sql_dump_round_trip, check_median_interval]
+
+
+def main() -> int:
+    failed = 0
+    for check in CHECKS:
+        try:
+            check()
+        except Exception:
+            failed += 1
+            print(f'FAILED {check.__name__}')
+            traceback.print_exc()
+        else:
+            print(f'ok     {check.__name__}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,239 @@
+"""
+Canonical SQL dumps of the generated fixtures, and rebuilding them from those.
+
+Every freshly generated .db-file is also dumped as SQL text, compressed with
+xz, to dumps/version<version>/<name>.sql.xz next to this module. A dump holds
+the user_version of the file and its schema in the order it was made in, each
+table followed by its rows by rowid. So the dump of a file only changes when
+its contents do, and git shows what a change to a generator did as a text
+diff, with
+
+    git config diff.xz.textconv xzcat
+
+(see .gitattributes). Rebuilding the fixtures from the dumps (replay) needs
+neither git nor QCoDeS:
+
+    python sql_dump.py replay [--to <fixture folder>] \
+        [version3/some_runs.db ...]
+    python sql_dump.py dump <.db-file> <.sql.xz-file>
+"""
+
+import argparse
+import glob
+import lzma
+import math
+import os
+import posixpath
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import db_tools
+
+DUMP_DIR_ENV = 'QCODES_FIXTURE_DUMP_DIR'
+
+DUMP_SUFFIX = '.sql.xz'
+
+# The number of rows inserted by one statement of a dump, each on a line of
+# its own. SQLite parses a long INSERT about twice as fast as single ones.
+ROWS_PER_INSERT = 100
+
+
+def dump_dir() -> str:
+    """
+    The folder holding the dumps, configurable via the environment
+    """
+    default = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'dumps')
+    return os.environ.get(DUMP_DIR_ENV, default)
+
+
+def dump_path(output: str) -> str:
+    """
+    The path of the dump of an output given relative to the fixture folder
+    """
+    stem, _ = posixpath.splitext(output)
+    return os.path.join(dump_dir(), *f'{stem}{DUMP_SUFFIX}'.split('/'))
+
+
+def _identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def literal(value: Any) -> str:
+    """
+    The SQL literal of a value read from SQLite, which reads back as the same
+    value
+    """
+    if value is None:
+        return 'NULL'
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '9e999' if value > 0 else '-9e999'
+        return repr(value)
+    if isinstance(value, bytes):
+        return f"X'{value.hex().upper()}'"
+    return "'" + value.replace("'", "''") + "'"
+
+
+def iter_dump(conn: sqlite3.Connection) -> Iterator[str]:
+    """
+    The statements of the canonical dump of a database, without the
+    transaction around them
+    """
+    user_version = conn.execute('PRAGMA user_version').fetchone()[0]
+    yield f'PRAGMA user_version={user_version};'
+
+    # In the order of the schema, so that the pages of a replayed file come
+    # in the same order as well
+    schema = conn.execute("SELECT type, name, sql FROM sqlite_master "
+                          "WHERE sql IS NOT NULL ORDER BY rowid").fetchall()
+    for type_, name, sql in schema:
+        if name.startswith('sqlite_'):
+            continue
+        yield f'{sql};'
+        if type_ == 'table':
+            yield from _iter_inserts(conn, name)
+
+    # Tables of SQLite itself, which SQLite makes when it needs them
+    tables = {name for type_, name, _ in schema if type_ == 'table'}
+    if 'sqlite_sequence' in tables:
+        yield 'DELETE FROM "sqlite_sequence";'
+        yield from _iter_inserts(conn, 'sqlite_sequence')
+    if 'sqlite_stat1' in tables:
+        yield 'ANALYZE sqlite_master;'
+        yield 'DELETE FROM "sqlite_stat1";'
+        yield from _iter_inserts(conn, 'sqlite_stat1')
+
+
+def _iter_inserts(conn: sqlite3.Connection, table: str) -> Iterator[str]:
+    quoted = _identifier(table)
+    cursor = conn.execute(f'SELECT * FROM {quoted} ORDER BY rowid')
+    while True:
+        rows = cursor.fetchmany(ROWS_PER_INSERT)
+        if not rows:
+            return
+        values = ',\n'.join(f"({','.join(literal(value) for value in row)})"
+                            for row in rows)
+        yield f'INSERT INTO {quoted} VALUES\n{values};'
+
+
+def dump(path: str, target: str) -> None:
+    """
+    Write the canonical dump of the .db-file at path to target, compressed
+    with xz
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+    partial = f'{target}.partial'
+    conn = sqlite3.connect(path)
+    try:
+        with lzma.open(partial, 'wt', encoding='utf-8') as f:
+            for statement in iter_dump(conn):
+                f.write(statement)
+                f.write('\n')
+    finally:
+        conn.close()
+    os.replace(partial, target)
+
+
+def replay(source: str, target: str) -> None:
+    """
+    Rebuild a .db-file at target from the dump at source, in one
+    transaction, and canonicalize it (see db_tools.canonicalize), so that it
+    is the same byte for byte as the file generated with --deterministic
+    """
+    with lzma.open(source, 'rt', encoding='utf-8') as f:
+        script = f.read()
+
+    os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+    partial = f'{target}.partial'
+    if os.path.exists(partial):
+        os.remove(partial)
+    conn = sqlite3.connect(partial, isolation_level=None)
+    try:
+        for pragma in db_tools.FAST_PRAGMAS:
+            conn.execute(pragma)
+        conn.executescript(f'BEGIN;\n{script}COMMIT;')
+    except sqlite3.Error:
+        conn.close()
+        os.remove(partial)
+        raise
+    conn.close()
+    db_tools.canonicalize(partial)
+    os.replace(partial, target)
+
+
+def dumped_outputs() -> List[str]:
+    """
+    The outputs (paths relative to the fixture folder) that have a dump
+    """
+    pattern = os.path.join(dump_dir(), '*', f'*{DUMP_SUFFIX}')
+    return sorted(
+        posixpath.join(os.path.basename(os.path.dirname(path)),
+                       os.path.basename(path)[:-len(DUMP_SUFFIX)] + '.db')
+        for path in glob.glob(pattern))
+
+
+def replay_all(fixturepath: str, outputs: Optional[Sequence[str]] = None,
+               jobs: Optional[int] = None) -> Dict[str, str]:
+    """
+    Rebuild the outputs (default: all that have a dump) in fixturepath from
+    their dumps on jobs threads, and return the path of each by output
+    """
+    outputs = dumped_outputs() if outputs is None else list(outputs)
+    paths = {output: os.path.join(fixturepath, *output.split('/'))
+             for output in outputs}
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for _ in executor.map(lambda output: replay(dump_path(output),
+                                                    paths[output]),
+                              outputs):
+            pass
+    return paths
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Dump a .db-file as canonical SQL, or rebuild the '
+                    'fixtures from their dumps')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    dump_parser = subparsers.add_parser('dump', help='dump a .db-file')
+    dump_parser.add_argument('path')
+    dump_parser.add_argument('target')
+
+    replay_parser = subparsers.add_parser('replay',
+                                          help='rebuild fixtures from dumps')
+    replay_parser.add_argument('outputs', nargs='*',
+                               help='fixtures to rebuild, like '
+                                    'version3/some_runs.db (default: all)')
+    replay_parser.add_argument('--to',
+                               help='folder to rebuild them in (default: the '
+                                    'fixture folder of QCoDeS)')
+    replay_parser.add_argument('--dump-dir',
+                               help=f'folder of the dumps (default: '
+                                    f'{dump_dir()})')
+    args = parser.parse_args(argv)
+
+    if args.command == 'dump':
+        dump(args.path, args.target)
+        return 0
+
+    if args.dump_dir is not None:
+        os.environ[DUMP_DIR_ENV] = args.dump_dir
+    fixturepath = args.to
+    if fixturepath is None:
+        # NB: this only locates QCoDeS, it neither imports it nor opens git
+        import utils as utils
+        fixturepath = utils.fixture_path()
+    paths = replay_all(fixturepath, args.outputs or None)
+    for path in paths.values():
+        print(path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,22 @@
 # General utilities for the database generation and loading scheme
-from typing import Dict, Tuple, Union
+from typing import Callable, Dict, NamedTuple, Optional, Sequence, Tuple, Union
+import argparse
+import fnmatch
+import functools
 import importlib
-from contextlib import contextmanager
+import importlib.util
+import inspect
+import multiprocessing
+from contextlib import ExitStack, contextmanager
 import os
+import posixpath
+import sys
 
-from git import Repo
+import db_tools
+import fixture_cache
+import instrumentation
+import manifest
+import sql_dump
 
 # A brief overview of what each version introduces:
 #
@@ -54,13 +66,240 @@ GIT_HASHES: Dict[Union[int, str], str] = {
     7: 'd651e3d07ca34a1127a4f86e09e6449c7e809479',
     8: '2a43ed4fc9518828e682b0c0681bc0b4dc5d3301'}
 
-__initpath = os.path.realpath(importlib.util.find_spec('qcodes').origin)
-gitrepopath = os.sep.join(__initpath.split(os.path.sep)[:-2])
 
-repo = Repo(gitrepopath)
+@functools.lru_cache(maxsize=None)
+def git_repo_path() -> str:
+    """
+    The folder of the git repository of the installed QCoDeS. It is found
+    without importing qcodes, but must be asked for before QCoDeS is put on
+    the path from a worktree or the git objects.
+    """
+    initpath = os.path.realpath(importlib.util.find_spec('qcodes').origin)
+    return os.sep.join(initpath.split(os.path.sep)[:-2])
+
+
+@functools.lru_cache(maxsize=None)
+def git_repo():
+    """
+    The git repository of the installed QCoDeS
+    """
+    from git import Repo
+
+    return Repo(git_repo_path())
+
+
+@functools.lru_cache(maxsize=None)
+def fixture_path() -> str:
+    """
+    The fixture folder of the installed QCoDeS
+    """
+    return os.path.join(git_repo_path(), 'qcodes', 'tests', 'dataset',
+                        'fixtures', 'db_files')
+
+
+# The state of QCoDeS that used to be computed on import, and is now computed
+# when first used, so that importing this module neither imports GitPython
+# nor opens the repository
+_LAZY_ATTRIBUTES = {'gitrepopath': git_repo_path,
+                    'repo': git_repo,
+                    'fixturepath': fixture_path}
+
+
+def __getattr__(name: str):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    return _LAZY_ATTRIBUTES[name]()
+
+
+FROM_GIT_OBJECTS_ENV = 'QCODES_FIXTURE_FROM_GIT_OBJECTS'
+SCALE_ENV = 'QCODES_FIXTURE_SCALE'
+FAST_ENV = 'QCODES_FIXTURE_FAST'
+BUILD_DIR_ENV = 'QCODES_FIXTURE_BUILD_DIR'
+RAW_ENV = 'QCODES_FIXTURE_RAW'
+DETERMINISTIC_ENV = 'QCODES_FIXTURE_DETERMINISTIC'
+REPORT_ENV = 'QCODES_FIXTURE_REPORT'
+PROFILE_ENV = 'QCODES_FIXTURE_PROFILE'
+TRACEMALLOC_ENV = 'QCODES_FIXTURE_TRACEMALLOC'
+ONLY_ENV = 'QCODES_FIXTURE_ONLY'
+
+
+class Scale(NamedTuple):
+    """
+    The size of the data of a generated .db-file: the number of runs, the
+    number of points per run and the number of parameters
+    """
+    runs: int
+    points: int
+    params: int
+
+
+def parse_scale(scale: str) -> Dict[str, int]:
+    """
+    Parse a scale given like 'runs=10000,points=1e5,params=50'. Any of the
+    three may be left out.
+    """
+    parsed = {}
+    for item in scale.split(','):
+        name, _, value = item.partition('=')
+        name = name.strip()
+        if name not in Scale._fields or not value:
+            raise ValueError(f'Invalid scale {scale!r}, must be given like '
+                             "'runs=10000,points=1e5,params=50'")
+        parsed[name] = int(float(value))
+    return parsed
+
+
+def get_scale(default: Scale) -> Scale:
+    """
+    The scale that a scalable generator should use: its default scale with
+    whatever was given with the --scale option replaced
+    """
+    given = os.environ.get(SCALE_ENV)
+    if not given:
+        return default
+    scale = default._replace(**parse_scale(given))
+    if scale.params < default.params:
+        raise ValueError(f'Can not scale down to {scale.params} parameters, '
+                         f'this .db-file needs at least {default.params}')
+    return scale
+
+
+def scaled_name(name: str, default: Scale) -> str:
+    """
+    The name of the .db-file of a scalable generator. Files generated with
+    the --scale option get the scale in their name, so that they never
+    replace the fixtures that the tests use.
+    """
+    if not os.environ.get(SCALE_ENV):
+        return name
+    stem, ext = os.path.splitext(name)
+    scale = get_scale(default)
+    return (f'{stem}_runs{scale.runs}_points{scale.points}'
+            f'_params{scale.params}{ext}')
+
+
+def user_version(version: Union[int, str]) -> int:
+    """
+    The user_version of the .db-files of a version in GIT_HASHES, e.g. 4 for
+    version '4a'
+    """
+    return int(str(version).rstrip('a'))
+
+
+def generates(*outputs: str, inputs: Sequence[str] = (),
+              seed: Optional[int] = None,
+              scale: Optional[Scale] = None,
+              scaled_only: bool = False) -> Callable:
+    """
+    Decorator declaring the database files that a generating function writes,
+    given as paths relative to fixturepath with forward slashes, e.g.
+    'version3/some_runs.db', along with the seed it gives to numpy.random.
+    Generators that declare their outputs can be served from the fixture cache.
+
+    Generators that read files written by other generators declare those as
+    inputs, so that they run after them and are run again when they change.
+    The helper modules that a generator calls are part of its source in the
+    fixture cache.
+
+    Generators that take their size from get_scale declare their default
+    scale, and name their outputs with scaled_name. Those whose files are too
+    large to be fixtures of the tests declare scaled_only, and only run with
+    the --scale option.
+    """
+    def decorator(generator: Callable) -> Callable:
+        generator.outputs = outputs
+        generator.inputs = tuple(inputs)
+        generator.seed = seed
+        generator.scale = scale
+        generator.scaled_only = scaled_only
+        generator.source = ''.join((inspect.getsource(generator),
+                                    *_helper_sources(generator)))
+        return generator
+    return decorator
+
+
+# The modules of this repository that generating functions call to write
+# their data, whose source is part of the source of those functions
+HELPER_MODULES = ('bulk_data', 'db_tools', 'raw_writer')
 
-fixturepath = os.path.join(gitrepopath, 'qcodes', 'tests', 'dataset',
-                           'fixtures', 'db_files')
+
+def _helper_sources(generator: Callable) -> Tuple[str, ...]:
+    """
+    The source of each helper module that a generating function refers to
+    """
+    names = set()
+    codes = [generator.__code__]
+    while codes:
+        code = codes.pop()
+        names.update(code.co_names)
+        codes.extend(const for const in code.co_consts
+                     if inspect.iscode(const))
+    return tuple(inspect.getsource(generator.__globals__[name])
+                 for name in sorted(names)
+                 if name in HELPER_MODULES and name in generator.__globals__)
+
+
+def outputs_of(generator: Callable) -> Tuple[str, ...]:
+    """
+    The paths relative to fixturepath of the files written by a generating
+    function, taking the --scale option into account
+    """
+    outputs = getattr(generator, 'outputs', ())
+    default = getattr(generator, 'scale', None)
+    if default is None:
+        return outputs
+    return tuple(posixpath.join(posixpath.dirname(output),
+                                scaled_name(posixpath.basename(output),
+                                            default))
+                 for output in outputs)
+
+
+def output_path(output: str) -> str:
+    """
+    The full path of an output given relative to fixturepath
+    """
+    return os.path.join(fixture_path(), *output.split('/'))
+
+
+def fixture_key(version: Union[int, str], generator: Callable) -> str:
+    """
+    The key of the fixtures of a generating function in the fixture cache
+    """
+    default = getattr(generator, 'scale', None)
+    scale = None if default is None else list(get_scale(default))
+
+    input_hashes = []
+    for input_ in getattr(generator, 'inputs', ()):
+        path = output_path(input_)
+        if not os.path.isfile(path):
+            raise ValueError(f'{generator.__name__} of version {version} '
+                             f'needs {input_}, which has not been generated')
+        input_hashes.append(fixture_cache.file_hash(path))
+
+    # Fixtures written in another way are cached apart, so that e.g. a hit is
+    # canonical too when deterministic fixtures are asked for
+    extra = [name for name, env in (('deterministic', DETERMINISTIC_ENV),
+                                    ('raw', RAW_ENV), ('fast', FAST_ENV))
+             if os.environ.get(env)]
+
+    return fixture_cache.cache_key(GIT_HASHES[version], generator, scale,
+                                   input_hashes, *extra)
+
+
+def select_generators(gens: Tuple) -> Tuple:
+    """
+    With the --scale option, only the scalable generators are to be run, and
+    without it, only those that are not scaled_only. With the --only option,
+    only those with an output matching its pattern.
+    """
+    scaled = bool(os.environ.get(SCALE_ENV))
+    only = os.environ.get(ONLY_ENV)
+    return tuple(
+        generator for generator in gens
+        if (getattr(generator, 'scale', None) is not None if scaled
+            else not getattr(generator, 'scaled_only', False))
+        and (not only or any(fnmatch.fnmatch(output, only)
+                             for output in outputs_of(generator))))
 
 
 @contextmanager
@@ -94,24 +333,464 @@ def checkout_to_old_version_and_run_generators(version: Union[int, str],
                                                gens: Tuple) -> None:
     """
     Check out the repo to an older version and run the generating functions
-    supplied.
+    supplied. Generators whose fixtures are in the cache are not run, and if
+    that goes for all of them, the repo is not checked out at all.
     """
 
-    with leave_untouched(repo):
+    gens = restore_cached_fixtures(version, gens)
+    if not gens:
+        return
+
+    with leave_untouched(git_repo()):
 
-        repo.git.checkout(GIT_HASHES[version])
+        with instrumentation.timed() as checkout:
+            git_repo().git.checkout(GIT_HASHES[version])
 
         # If QCoDeS is not installed in editable mode, it makes no difference
         # to do our git magic, since the import will be from site-packages in
         # the environment folder, and not from the git-managed folder
-        import qcodes
-        qcpath = os.sep.join(qcodes.__file__.split(os.sep)[:-2])
-
-        # Windows and paths... There can be random un-capitalizations
-        if qcpath.lower() != gitrepopath.lower():
-            raise ValueError('QCoDeS does not seem to be installed in editable'
-                             ' mode, can not proceed. To use this script, '
-                             'uninstall QCoDeS and reinstall it with pip '
-                             'install -e <path-to-qcodes-folder>')
-        for generator in gens:
-            generator()
+        with instrumentation.timed() as qcodes_import:
+            check_qcodes_location(git_repo_path())
+
+        run_generators(version, gens,
+                       setup={'checkout_time': checkout['wall_time'],
+                              'import_time': qcodes_import['wall_time']})
+
+
+def restore_cached_fixtures(version: Union[int, str], gens: Tuple) -> Tuple:
+    """
+    Restore the fixtures of the generating functions supplied from the cache
+    where possible and return the generating functions that still need to run
+    """
+    remaining = []
+    for generator in select_generators(gens):
+        # Generators whose inputs are still to be written by others must run
+        inputs_ready = all(os.path.isfile(output_path(input_))
+                           for input_ in getattr(generator, 'inputs', ()))
+        if inputs_ready and fixture_cache.restore(
+                fixture_key(version, generator), outputs_of(generator),
+                fixture_path()):
+            record_fixtures(version, generator)
+        else:
+            remaining.append(generator)
+    return tuple(remaining)
+
+
+def record_fixtures(version: Union[int, str], generator: Callable) -> None:
+    """
+    Record the fixtures of a generating function in the manifests of their
+    version folders
+    """
+    inputs = {input_: fixture_cache.file_hash(output_path(input_))
+              for input_ in getattr(generator, 'inputs', ())}
+    for output in outputs_of(generator):
+        manifest.record(output_path(output), GIT_HASHES[version], generator,
+                        inputs)
+
+
+def dump_fixtures(generator: Callable) -> None:
+    """
+    Dump the freshly generated fixtures of a generating function as SQL (see
+    sql_dump.py). Files generated with the --scale option are not fixtures
+    of the tests, and are not dumped.
+    """
+    if os.environ.get(SCALE_ENV):
+        return
+    for output in outputs_of(generator):
+        sql_dump.dump(output_path(output), sql_dump.dump_path(output))
+
+
+def run_generators(version: Union[int, str], gens: Tuple,
+                   setup: Optional[Dict[str, float]] = None) -> None:
+    """
+    Run the generating functions supplied and cache their fixtures. QCoDeS
+    must already be importable at the supplied version. The setup timings
+    (checkout_time, import_time) go into the report of the first generator.
+    """
+    fast = bool(os.environ.get(FAST_ENV))
+    build_dir = os.environ.get(BUILD_DIR_ENV)
+    deterministic = bool(os.environ.get(DETERMINISTIC_ENV))
+    report = os.environ.get(REPORT_ENV)
+    profile_dir = os.environ.get(PROFILE_ENV)
+    tracemalloc_dir = os.environ.get(TRACEMALLOC_ENV)
+    setup = dict(setup or {})
+
+    for generator in gens:
+        paths = [output_path(output) for output in outputs_of(generator)]
+
+        with instrumentation.timed() as timings:
+            with ExitStack() as stack:
+                if profile_dir:
+                    stack.enter_context(instrumentation.profiled(
+                        instrumentation.profile_path(
+                            profile_dir, version, generator.__name__,
+                            '.prof')))
+                if tracemalloc_dir:
+                    stack.enter_context(instrumentation.traced_memory(
+                        instrumentation.profile_path(
+                            tracemalloc_dir, version, generator.__name__,
+                            '.tracemalloc.json')))
+                if build_dir:
+                    stack.enter_context(db_tools.built_elsewhere(paths,
+                                                                 build_dir))
+                if fast:
+                    stack.enter_context(db_tools.fast_writes())
+                if deterministic:
+                    stack.enter_context(db_tools.frozen_clock())
+                    stack.enter_context(default_guid_components())
+                reset_global_state()
+                generator()
+
+            if fast:
+                for path in paths:
+                    db_tools.finalize(path, user_version(version))
+            if deterministic:
+                for path in paths:
+                    db_tools.canonicalize(path)
+
+        fixture_cache.store(fixture_key(version, generator),
+                            outputs_of(generator), fixture_path())
+        record_fixtures(version, generator)
+        dump_fixtures(generator)
+
+        if report:
+            instrumentation.record(report, version, generator.__name__,
+                                   dict(zip(outputs_of(generator), paths)),
+                                   {**setup, **timings})
+            setup = {}
+
+
+def reset_global_state() -> None:
+    """
+    Forget the global state of QCoDeS that a generating function may leave
+    behind for the next one, like a default Station, whose snapshot the runs
+    of later generators would pick up
+    """
+    import qcodes
+
+    station = getattr(qcodes, 'Station', None)
+    if station is not None:
+        station.default = None
+
+
+@contextmanager
+def default_guid_components():
+    """
+    Context manager within which the GUIDs that QCoDeS makes have the default
+    sample, location and work station, whatever the qcodesrc.json of the user
+    says. Versions of QCoDeS without GUIDs are left alone.
+    """
+    import qcodes
+
+    try:
+        components = qcodes.config['GUID_components']
+    except KeyError:
+        yield
+        return
+
+    original = {name: components[name]
+                for name in ('sample', 'location', 'work_station')
+                if name in components}
+    components.update({name: 0 for name in original})
+    try:
+        yield
+    finally:
+        components.update(original)
+
+
+def check_qcodes_location(expected_path: str) -> None:
+    """
+    Import qcodes and make sure that it is imported from the git-managed
+    folder at expected_path
+    """
+    import qcodes
+    qcpath = os.sep.join(qcodes.__file__.split(os.sep)[:-2])
+
+    # Windows and paths... There can be random un-capitalizations
+    if qcpath.lower() != expected_path.lower():
+        raise ValueError('QCoDeS does not seem to be installed in editable'
+                         ' mode, can not proceed. To use this script, '
+                         'uninstall QCoDeS and reinstall it with pip '
+                         'install -e <path-to-qcodes-folder>')
+
+
+def add_worktree(version: Union[int, str], directory: str) -> str:
+    """
+    Add a detached git worktree of the QCoDeS repo at the commit of the
+    supplied version inside directory and return the path of the worktree.
+    The working tree of the repo itself is not touched.
+    """
+    path = os.path.join(directory, f'version{version}')
+    git_repo().git.worktree('add', '--detach', '--force', path,
+                            GIT_HASHES[version])
+    return path
+
+
+def remove_worktree(path: str) -> None:
+    """
+    Remove a worktree previously made with add_worktree
+    """
+    git_repo().git.worktree('remove', '--force', path)
+
+
+def run_generators_in_worktree(version: Union[int, str], gens: Tuple,
+                               worktree: str,
+                               checkout_time: Optional[float] = None) -> None:
+    """
+    Run the generating functions supplied with QCoDeS imported from a
+    worktree checked out at the supplied version (or from the QCoDeS repo
+    itself, if that is checked out at the version). This must happen in a
+    process that has not yet imported qcodes, and the fixtures are still
+    written to the fixturepath of the main repo. The time it took to add the
+    worktree, if given, goes into the report.
+    """
+
+    if 'qcodes' in sys.modules:
+        raise ValueError('QCoDeS has already been imported in this process, '
+                         f'can not import version {version} from worktree '
+                         f'{worktree}.')
+
+    # The fixtures go to the fixture folder of the installed QCoDeS, not to
+    # that of the worktree
+    fixture_path()
+    sys.path.insert(0, worktree)
+    importlib.invalidate_caches()
+
+    with instrumentation.timed() as qcodes_import:
+        check_qcodes_location(worktree)
+
+    run_generators(version, restore_cached_fixtures(version, gens),
+                   setup={'checkout_time': checkout_time,
+                          'import_time': qcodes_import['wall_time']})
+
+
+def run_generators_from_git_objects(version: Union[int, str],
+                                    gens: Tuple) -> None:
+    """
+    Run the generating functions supplied with QCoDeS imported straight from
+    the git objects of the commit of the supplied version. Nothing is checked
+    out, so the repo may be dirty and may be in use by other processes. This
+    must happen in a process that has not yet imported qcodes.
+    """
+    # NB: git_import imports GitPython, so it is imported when needed
+    import git_import
+
+    gens = restore_cached_fixtures(version, gens)
+    if not gens:
+        return
+
+    with ExitStack() as stack:
+        with instrumentation.timed() as checkout:
+            stack.enter_context(git_import.imported_from_commit(
+                git_repo(), GIT_HASHES[version]))
+        with instrumentation.timed() as qcodes_import:
+            import qcodes  # noqa: F401
+
+        run_generators(version, gens,
+                       setup={'checkout_time': checkout['wall_time'],
+                              'import_time': qcodes_import['wall_time']})
+
+
+def run_generators_in_parallel(version: Union[int, str], gens: Tuple,
+                               jobs: int) -> None:
+    """
+    Run the generating functions supplied on a process pool of size jobs,
+    each in a fresh process (so with its own global state and SQLite
+    connections), and each after the generators writing its inputs. QCoDeS
+    is imported from the repo checked out at the supplied version, or from
+    the git objects.
+    """
+    # NB: the scheduler imports this module, so it is imported here
+    import scheduler
+
+    # The scheduler restores what it can from the cache as it goes, since the
+    # inputs of a generator may be written by another one of this version.
+    # If all can be restored, the repo is not checked out at all.
+    nodes = scheduler.nodes_of(version, gens)
+    if from_git_objects() or 'run' not in scheduler.plan(nodes).values():
+        failed = scheduler.run(nodes, jobs)
+    else:
+        with leave_untouched(git_repo()):
+            git_repo().git.checkout(GIT_HASHES[version])
+            check_qcodes_location(git_repo_path())
+            failed = scheduler.run(nodes, jobs, checkout=git_repo_path())
+
+    if failed:
+        raise ValueError('Generation failed for '
+                         f'{[node.generator for node in failed]}')
+
+
+def in_dependency_order(version: Union[int, str], gens: Tuple) -> Tuple:
+    """
+    The generating functions supplied, ordered such that each comes after the
+    generators writing its inputs
+    """
+    # NB: the scheduler imports this module, so it is imported here
+    import scheduler
+
+    by_name = {generator.__name__: generator for generator in gens}
+    nodes = scheduler.nodes_of(version, gens)
+    order = scheduler.topological_order(scheduler.dependencies(nodes))
+    return tuple(by_name[node.generator] for node in order)
+
+
+def from_git_objects() -> bool:
+    """
+    Whether QCoDeS should be imported from git objects instead of a checkout
+    """
+    return bool(os.environ.get(FROM_GIT_OBJECTS_ENV))
+
+
+def raw_writes() -> bool:
+    """
+    Whether the runs of fixture specs should be written with the raw writer
+    instead of the QCoDeS API
+    """
+    return bool(os.environ.get(RAW_ENV))
+
+
+def parse_version(version: str) -> Union[int, str]:
+    """
+    Turn a version given on the command line into a key of GIT_HASHES
+    """
+    key: Union[int, str] = int(version) if version.isdigit() else version
+    if key not in GIT_HASHES:
+        raise argparse.ArgumentTypeError(f'Unknown version {version}, must '
+                                         'be one of '
+                                         f'{list(GIT_HASHES.keys())}')
+    return key
+
+
+def _scale_argument(scale: str) -> str:
+    try:
+        parse_scale(scale)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return scale
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Add the command line options shared by all the generating scripts
+    """
+    parser.add_argument('--no-cache', action='store_true',
+                        help='always run the generators, neither restoring '
+                             'nor storing fixtures in the cache')
+    parser.add_argument('--cache-dir',
+                        help='folder of the fixture cache (default: '
+                             f'{fixture_cache.cache_dir()})')
+    parser.add_argument('--scale', type=_scale_argument,
+                        help='generate only the .db-files with runs of '
+                             'configurable size, at the size given like '
+                             "'runs=10000,points=1e5,params=50'")
+    parser.add_argument('--only', metavar='PATTERN',
+                        help='generate only the .db-files matching this glob '
+                             "pattern, like '*/many_runs*'")
+    parser.add_argument('--fast', action='store_true',
+                        help='write with journal in memory and without '
+                             'syncing, then VACUUM and ANALYZE the files')
+    parser.add_argument('--build-dir',
+                        help="build the .db-files in this folder, or with "
+                             "':memory:' in memory, and copy them in place "
+                             'when they are done')
+    parser.add_argument('--deterministic', action='store_true',
+                        help='freeze the clock and the GUID components while '
+                             'generating and canonicalize the files, so that '
+                             'the same inputs give the same bytes')
+    parser.add_argument('--report',
+                        help='write the timings, row counts, sizes and '
+                             'memory use of each generator to this JSON lines '
+                             'file and print a summary')
+    parser.add_argument('--profile', nargs='?', const='profiles',
+                        metavar='DIR',
+                        help='run each generator under cProfile and save '
+                             'the stats in DIR (default: %(const)s)')
+    parser.add_argument('--tracemalloc', nargs='?', const='profiles',
+                        metavar='DIR',
+                        help='trace the memory allocations of each generator '
+                             'and save the peak and top allocating lines in '
+                             'DIR (default: %(const)s)')
+    parser.add_argument('--raw', action='store_true',
+                        help='write all but one run of the fixture specs '
+                             'straight into the tables with SQL')
+    parser.add_argument('--dump-dir',
+                        help='folder to dump the generated fixtures to as '
+                             f'SQL (default: {sql_dump.dump_dir()})')
+    parser.add_argument('--from-git-objects', action='store_true',
+                        help='import QCoDeS straight from the git objects of '
+                             'the old commit instead of checking it out')
+
+
+def apply_arguments(args: argparse.Namespace) -> None:
+    """
+    Apply the shared command line options. They are passed on through the
+    environment, so that they also reach the processes running generators.
+    """
+    if args.no_cache:
+        os.environ[fixture_cache.NO_CACHE_ENV] = '1'
+    if args.cache_dir is not None:
+        os.environ[fixture_cache.CACHE_DIR_ENV] = args.cache_dir
+    if args.dump_dir is not None:
+        os.environ[sql_dump.DUMP_DIR_ENV] = os.path.abspath(args.dump_dir)
+    if args.from_git_objects:
+        os.environ[FROM_GIT_OBJECTS_ENV] = '1'
+    if args.fast:
+        os.environ[FAST_ENV] = '1'
+    if args.build_dir is not None:
+        os.environ[BUILD_DIR_ENV] = args.build_dir
+    if args.raw:
+        os.environ[RAW_ENV] = '1'
+    if args.deterministic:
+        os.environ[DETERMINISTIC_ENV] = '1'
+    if args.profile is not None:
+        os.environ[PROFILE_ENV] = os.path.abspath(args.profile)
+    if args.tracemalloc is not None:
+        os.environ[TRACEMALLOC_ENV] = os.path.abspath(args.tracemalloc)
+    if args.report is not None:
+        os.environ[REPORT_ENV] = os.path.abspath(args.report)
+        # A fresh report for every invocation
+        open(args.report, 'w').close()
+    if args.scale is not None:
+        os.environ[SCALE_ENV] = args.scale
+    if args.only is not None:
+        os.environ[ONLY_ENV] = args.only
+
+
+def main(version: Union[int, str], gens: Tuple,
+         argv: Optional[Sequence[str]] = None) -> None:
+    """
+    The command line entry point of a generate_version_<version>.py script
+    """
+    parser = argparse.ArgumentParser(
+        description=f'Generate version {version} database files for qcodes\' '
+                    'test suite to consume')
+    parser.add_argument('-j', '--jobs', type=int,
+                        default=multiprocessing.cpu_count(),
+                        help='number of generators to run concurrently')
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    apply_arguments(args)
+    gens = select_generators(gens)
+
+    if args.jobs > 1 and len(gens) > 1:
+        run_generators_in_parallel(version=version, gens=gens,
+                                   jobs=args.jobs)
+        print_report()
+        return
+
+    gens = in_dependency_order(version, gens)
+    if from_git_objects():
+        run_generators_from_git_objects(version=version, gens=gens)
+    else:
+        checkout_to_old_version_and_run_generators(version=version, gens=gens)
+
+    print_report()
+
+
+def print_report() -> None:
+    """
+    Print the summary of the report, if one was asked for
+    """
+    report = os.environ.get(REPORT_ENV)
+    if report:
+        print(instrumentation.summary(instrumentation.read(report)))